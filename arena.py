@@ -0,0 +1,158 @@
+import random
+from array import array
+from collections import deque
+
+from engine import EAST, OPPOSITE, SnakeEngine
+
+ARENA_CELLS = 50
+FRUITS = 8
+SPAWN_TRIES = 50  # Random spots tried before a spawn gives up on a crowded board
+
+
+class ArenaSnake:  # One player's snake in an Arena
+    def __init__(self, snake_id, cells):
+        self.id = snake_id
+        self.body = deque(cells)  # Cell indices, head first
+        self.direction = EAST
+        self.heading = EAST  # The direction it last moved in, which a turn can't reverse
+        self.new_block = False
+        self.vacated = None
+        self.alive = True
+        self.score = 0
+
+    @property
+    def head(self):
+        return self.body[0]
+
+    @property
+    def length(self):
+        return len(self.body)
+
+
+class Arena:  # Several snakes on one wrapping board, playing by SnakeEngine's rules with crashes into each other too
+    def __init__(self, cell_number=ARENA_CELLS, fruit_count=FRUITS, seed=None):
+        self.cell_number = cell_number
+        self.rng = random.Random(seed)
+        cells = cell_number * cell_number
+        self.occupied = bytearray(cells)  # Segments per cell, counting every snake
+        # The empty cells, kept the same way as SnakeEngine's so fruit and spawns can pick from them directly
+        self.free = array("i", range(cells))
+        self.free_index = array("i", range(cells))
+        self.snakes = {}
+        self.fruits = [None] * fruit_count  # Each fruit keeps its slot, so a client only hears which one moved
+        self.fruit_at = {}  # Cell -> fruit slot
+        self.ticks = 0
+        for slot in range(fruit_count):
+            self.place_fruit(slot)
+
+    def position(self, cell):
+        y, x = divmod(cell, self.cell_number)
+        return x, y
+
+    # The free cell bookkeeping is SnakeEngine's own, run on this board's arrays
+    claim = SnakeEngine.claim
+    release = SnakeEngine.release
+
+    def occupy(self, cell):
+        if not self.occupied[cell]:
+            self.claim(cell)
+        self.occupied[cell] += 1
+
+    def vacate(self, cell):
+        self.occupied[cell] -= 1
+        if not self.occupied[cell]:
+            self.release(cell)
+
+    def neighbour(self, cell, direction):  # The next cell over, wrapping through the walls
+        n = self.cell_number
+        y, x = divmod(cell, n)
+        dx, dy = direction
+        return (y + dy) % n * n + (x + dx) % n
+
+    def spawn(self, snake_id):  # Puts a new three long snake on an empty stretch heading east, None if there's no room
+        for _ in range(SPAWN_TRIES):
+            if not self.free:
+                break
+            tail = self.free[self.rng.randrange(len(self.free))]
+            cells = [tail]
+            for _ in range(3):  # Two more segments and a clear cell ahead of the head
+                cells.append(self.neighbour(cells[-1], EAST))
+            if any(self.occupied[cell] or cell in self.fruit_at for cell in cells):
+                continue
+            snake = ArenaSnake(snake_id, reversed(cells[:3]))
+            for cell in snake.body:
+                self.occupy(cell)
+            self.snakes[snake_id] = snake
+            return snake
+        return None
+
+    def remove(self, snake_id):  # Takes a snake off the board, dead or alive
+        snake = self.snakes.pop(snake_id, None)
+        if snake is not None and snake.alive:
+            self.clear_body(snake)
+
+    def clear_body(self, snake):
+        for cell in snake.body:
+            self.vacate(cell)
+
+    def turn(self, snake_id, direction):  # Changes direction unless it would reverse the snake into itself
+        snake = self.snakes.get(snake_id)
+        if snake is None or direction == OPPOSITE[snake.heading]:
+            return False
+        snake.direction = direction
+        return True
+
+    def step(self):  # Moves every snake at once, returns (moved snakes, snakes that died, fruit slots that moved)
+        self.ticks += 1
+        moved = [snake for snake in self.snakes.values() if snake.alive]
+
+        # Every tail leaves before any head arrives, so chasing another snake's tail is as safe as chasing your own
+        for snake in moved:
+            if snake.new_block:
+                snake.new_block = False
+                snake.vacated = None
+            else:
+                snake.vacated = snake.body.pop()
+                self.vacate(snake.vacated)
+        for snake in moved:
+            snake.heading = snake.direction
+            head = self.neighbour(snake.body[0], snake.direction)
+            snake.body.appendleft(head)
+            self.occupy(head)
+
+        eaten = []
+        for snake in moved:
+            slot = self.fruit_at.get(snake.head)
+            if slot is not None and self.fruits[slot] is not None:
+                snake.new_block = True
+                snake.score += 1
+                eaten.append(slot)
+                self.fruits[slot] = None
+                del self.fruit_at[snake.head]
+
+        # A head sharing its cell with anything, its own body, another body or another head, crashes. Every crash is
+        # found before any body comes off the board, so two heads meeting both die
+        dead = [snake for snake in moved if self.occupied[snake.head] > 1]
+        for snake in dead:
+            snake.alive = False
+            self.clear_body(snake)
+            del self.snakes[snake.id]
+
+        for slot in eaten:
+            self.place_fruit(slot)
+        return moved, dead, eaten
+
+    def place_fruit(self, slot):  # Moves a fruit to a random empty cell no other fruit is on
+        old = self.fruits[slot]
+        if old is not None:
+            del self.fruit_at[old]
+        self.fruits[slot] = None
+        for _ in range(SPAWN_TRIES):
+            if not self.free:
+                return
+            cell = self.free[self.rng.randrange(len(self.free))]
+            if cell not in self.fruit_at:
+                self.fruits[slot] = cell
+                self.fruit_at[cell] = slot
+                return
+
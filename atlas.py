@@ -0,0 +1,136 @@
+import json
+import os
+from concurrent.futures import Future
+
+import pygame
+
+ATLAS_WIDTH = 2048
+CACHE_DIR = "cache"
+
+
+class SpriteAtlas:  # Every sprite pre-scaled for the current display and packed into one surface
+    def __init__(self, surface, rects):
+        self.surface = surface
+        self.rects = rects
+
+    def blit(self, target, name, dest):  # Draws a sprite with its top left corner at dest
+        target.blit(self.surface, dest, self.rects[name])
+
+    def source(self, name):  # The surface and area to blit a sprite from, for batching with Surface.blits
+        return self.surface, self.rects[name]
+
+    def restore(self, target, name, rect):  # Draws just the part of a sprite that sits under rect, if drawn at (0, 0)
+        self.blit_area(target, name, rect.topleft, rect)
+
+    def blit_area(self, target, name, dest, area):  # Draws the given area of a sprite, measured from its top left
+        sprite = self.rects[name]
+        target.blit(self.surface, dest, pygame.Rect(area).move(sprite.topleft).clip(sprite))
+
+    def get_rect(self, name, **kwargs):  # Same as Surface.get_rect, for a sprite in the atlas
+        rect = pygame.Rect((0, 0), self.rects[name].size)
+        for attribute, value in kwargs.items():
+            setattr(rect, attribute, value)
+        return rect
+
+    @classmethod
+    def build(cls, sources, sizes):  # Scales each source surface to its size and shelf-packs them into one surface
+        names = sorted(sources, key=lambda name: (-sizes[name][1], name))
+        width = max([ATLAS_WIDTH] + [sizes[name][0] for name in names])
+        rects = {}
+        x = y = shelf_height = 0
+        for name in names:
+            sprite_width, sprite_height = sizes[name]
+            if x + sprite_width > width:
+                x, y = 0, y + shelf_height
+                shelf_height = 0
+            rects[name] = pygame.Rect(x, y, sprite_width, sprite_height)
+            x += sprite_width
+            shelf_height = max(shelf_height, sprite_height)
+
+        surface = pygame.Surface((width, max(1, y + shelf_height)), pygame.SRCALPHA).convert_alpha()
+        surface.fill((0, 0, 0, 0))
+        for name in names:
+            source = pygame.transform.scale(sources[name].convert_alpha(), rects[name].size)
+            # Adding onto the cleared atlas copies the pixels exactly, where a normal blit would blend the edges
+            surface.blit(source, rects[name], special_flags=pygame.BLEND_RGBA_ADD)
+        return cls(surface, rects)
+
+    def save(self, path, fingerprint):  # Saves the pixels and rect table so the next launch skips scaling
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".bin", "wb") as pixels:
+            pixels.write(pygame.image.tostring(self.surface, "RGBA"))
+        index = {
+            "fingerprint": fingerprint,
+            "size": list(self.surface.get_size()),
+            "rects": {name: list(rect) for name, rect in self.rects.items()},
+        }
+        with open(path + ".json", "w") as table:
+            json.dump(index, table)
+
+    @classmethod
+    def load(cls, path, fingerprint):  # Reads a saved atlas back, or returns None if it is missing or out of date
+        try:
+            with open(path + ".json") as table:
+                index = json.load(table)
+            if index["fingerprint"] != fingerprint:
+                return None
+            with open(path + ".bin", "rb") as pixels:
+                surface = pygame.image.fromstring(pixels.read(), tuple(index["size"]), "RGBA").convert_alpha()
+        except (OSError, ValueError, KeyError):
+            return None
+        return cls(surface, {name: pygame.Rect(rect) for name, rect in index["rects"].items()})
+
+
+class AtlasPages:  # Several atlases used as one, any still loading in the background are waited on at first use
+    def __init__(self):
+        self.pages = []
+        self.page_of = {}
+
+    def add(self, names, page):  # The page can be a SpriteAtlas or a Future that will become one
+        self.pages.append(page)
+        for name in names:
+            self.page_of[name] = len(self.pages) - 1
+
+    def page(self, name):
+        index = self.page_of[name]
+        page = self.pages[index]
+        if isinstance(page, Future):
+            page = self.pages[index] = page.result()
+        return page
+
+    def blit(self, target, name, dest):
+        self.page(name).blit(target, name, dest)
+
+    def source(self, name):
+        return self.page(name).source(name)
+
+    def restore(self, target, name, rect):
+        self.page(name).restore(target, name, rect)
+
+    def blit_area(self, target, name, dest, area):
+        self.page(name).blit_area(target, name, dest, area)
+
+    def get_rect(self, name, **kwargs):
+        return self.page(name).get_rect(name, **kwargs)
+
+
+def fingerprint(paths, sizes, source):  # Changes with any source image or target size, so stale caches rebuild
+    return [[name, source.checksum(paths[name]), list(sizes[name])] for name in sorted(paths)]
+
+
+def load_atlas(page, resolution, paths, sizes, source, executor=None, cache_dir=CACHE_DIR):  # Loads or builds an atlas
+    path = os.path.join(cache_dir, f"atlas_{page}_{resolution[0]}x{resolution[1]}")
+    key = fingerprint(paths, sizes, source)
+    atlas = SpriteAtlas.load(path, key)
+    if atlas is None:
+        names = sorted(paths)
+        if executor is None:
+            images = [source.image(paths[name]) for name in names]
+        else:
+            images = list(executor.map(lambda name: source.image(paths[name]), names))
+        atlas = SpriteAtlas.build(dict(zip(names, images)), sizes)
+        try:
+            atlas.save(path, key)
+        except OSError:
+            pass  # A read-only install just rebuilds the atlas each launch
+    return atlas
@@ -0,0 +1,68 @@
+import sys
+import time
+
+import pygame
+
+MUSIC_PATHS = ("Sound/bgm.ogg", "Sound/bgm.wav")  # The first of these that exists is streamed as the music
+SFX_CHANNELS = 4
+MIN_INTERVALS = {"crunch": 0.06, "crash": 0.25}  # Seconds before the same effect can start again
+DEFAULT_INTERVAL = 0.05
+
+
+class Music:  # Background music streamed by mixer.music, so only a small buffer of the track is ever decoded
+    def __init__(self, source, paths=MUSIC_PATHS):
+        self.source = source
+        self.paths = paths
+        self.loaded = None  # The path being streamed, once one has been found
+
+    def play(self):  # Starts the music looping, or carries on without it if there's no mixer or no track
+        if not pygame.mixer.get_init():
+            return False
+        if self.loaded is None:
+            for path in self.paths:
+                try:
+                    pygame.mixer.music.load(self.source.music(path))
+                except (FileNotFoundError, pygame.error):
+                    continue
+                self.loaded = path
+                break
+            else:
+                print(f"No background music found at {' or '.join(self.paths)}, playing without it", file=sys.stderr)
+                self.paths = ()  # Don't look again
+                return False
+        pygame.mixer.music.play(-1)
+        return True
+
+
+class SfxMixer:  # Plays effects on a few channels of their own, stealing the oldest voice once they're all busy
+    def __init__(self, channels=SFX_CHANNELS, intervals=MIN_INTERVALS):
+        self.enabled = bool(pygame.mixer.get_init())
+        self.intervals = intervals
+        self.last_played = {}  # Effect name -> when it last started
+        self.started = [0.0] * channels  # When each channel's current voice started
+        self.stolen = self.skipped = 0
+        self.channels = []
+        if self.enabled:
+            pygame.mixer.set_num_channels(max(channels, pygame.mixer.get_num_channels()))
+            pygame.mixer.set_reserved(channels)  # Sound.play() on its own never picks these
+            self.channels = [pygame.mixer.Channel(index) for index in range(channels)]
+
+    def play(self, name, sound, now=None):  # Returns the channel it went out on, or None if it was dropped
+        if not self.enabled:
+            return None
+        now = time.perf_counter() if now is None else now
+        # Another copy of an effect that's only just started adds noise, not information
+        if now - self.last_played.get(name, float("-inf")) < self.intervals.get(name, DEFAULT_INTERVAL):
+            self.skipped += 1
+            return None
+        for index, channel in enumerate(self.channels):
+            if not channel.get_busy():
+                break
+        else:
+            index = min(range(len(self.channels)), key=self.started.__getitem__)
+            self.stolen += 1
+        channel = self.channels[index]
+        channel.play(sound)
+        self.started[index] = now
+        self.last_played[name] = now
+        return channel
@@ -0,0 +1,268 @@
+import argparse
+import random
+import time
+from array import array
+
+from engine import CELL_NUMBER, NORTH, SOUTH, EAST, WEST, SnakeEngine
+
+DIRECTIONS = (NORTH, SOUTH, EAST, WEST)
+SAFETY = 2  # A shortcut lands at least this many cells short of the tail, room for the tick the tail waits on growth
+
+
+class Autopilot:  # Drives a SnakeEngine on its own, for soak tests and attract mode
+    def __init__(self, engine):
+        self.engine = engine
+        n = engine.cell_number
+        self.cell_count = cells = n * n
+
+        # Each cell's neighbours in DIRECTIONS order, wrapping through the walls the way the engine does
+        self.neighbours = array("i", [0]) * (cells * 4)
+        for cell in range(cells):
+            y, x = divmod(cell, n)
+            for index, (dx, dy) in enumerate(DIRECTIONS):
+                self.neighbours[cell * 4 + index] = (y + dy) % n * n + (x + dx) % n
+
+        # On a wrapping board, n - 1 steps east then one south visits every cell once before coming back round.
+        # order is each cell's place on that cycle; the snake's starting body already lies along it
+        self.order = array("i", [0]) * cells
+        for cell in range(cells):
+            y, x = divmod(cell, n)
+            self.order[cell] = y * n + (x + y) % n
+
+        # Search buffers, allocated once; a cell counts as seen or blocked when its stamp matches the current one
+        self.queue = array("i", [0]) * cells
+        self.parent = array("i", [0]) * cells
+        self.distance = array("i", [0]) * cells
+        self.seen = array("i", [0]) * cells
+        self.blocked = array("i", [0]) * cells
+        self.stamp = 0
+
+        self.plan = []  # Cells still to visit on the way to plan_fruit, next one last
+        self.plan_fruit = None
+        self.aligned = False  # Whether the body lies in cycle order, after which it never leaves it
+        self.decisions = 0
+        self.replans = 0
+
+    def reset(self):  # Forgets the plan, e.g. after a person has been steering
+        self.plan = []
+        self.plan_fruit = None
+        self.aligned = False
+
+    def decide(self):  # Picks the direction for the next tick
+        self.decisions += 1
+        engine = self.engine
+        if not self.aligned:
+            self.aligned = self.is_aligned()
+        cell = self.cycle_step() if self.aligned else self.free_step()
+        if cell is None:
+            return engine.direction
+        head = engine.head * 4
+        for index in range(4):
+            if self.neighbours[head + index] == cell:
+                return DIRECTIONS[index]
+        return engine.direction
+
+    def next_stamp(self):
+        self.stamp += 1
+        return self.stamp
+
+    def ahead(self, start, cell):  # How far past start the cell is along the cycle
+        return (self.order[cell] - self.order[start]) % self.cell_count
+
+    def is_aligned(self):  # True if the body runs tail to head in cycle order, which cycle_step relies on
+        tail = self.engine.tail
+        previous = self.cell_count
+        for cell in self.engine.cells():
+            place = self.ahead(tail, cell)
+            if place >= previous:
+                return False
+            previous = place
+        return True
+
+    def planned_step(self, valid):  # The next cell of the current plan, if it is still heading for the fruit
+        if not self.plan or self.plan_fruit != self.engine.fruit:
+            return None
+        cell = self.plan[-1]
+        head = self.engine.head * 4
+        if cell not in self.neighbours[head:head + 4] or not valid(cell):
+            return None
+        return self.plan.pop()
+
+    def cycle_step(self):  # Follows the cycle, cutting across it towards the fruit when that can't trap the snake
+        # Everything between the head and the tail along the cycle is empty, so any route that only moves forward
+        # along the cycle and stops short of the tail stays on empty cells and keeps the body in cycle order
+        engine = self.engine
+        head, fruit = engine.head, engine.fruit
+        limit = self.ahead(head, engine.tail) - SAFETY
+        if fruit is not None and self.ahead(head, fruit) <= limit:
+            cell = self.planned_step(lambda step: True)
+            if cell is not None:
+                return cell
+            if self.search_forward(head, fruit):
+                return self.plan.pop()
+
+        return self.cycle_next(head)  # Otherwise just take the next cell on the cycle, which is always free
+
+    def cycle_next(self, cell):
+        n = self.engine.cell_number
+        y, x = divmod(cell, n)
+        return self.neighbours[cell * 4 + (1 if (x + y) % n == n - 1 else 2)]
+
+    def search_forward(self, head, fruit):  # Breadth first search that only ever moves forward along the cycle
+        self.replans += 1
+        order, cells, neighbours, seen, parent, queue = (
+            self.order, self.cell_count, self.neighbours, self.seen, self.parent, self.queue)
+        stamp = self.next_stamp()
+        start = order[head]
+        target = (order[fruit] - start) % cells
+        queue[0] = head
+        seen[head] = stamp
+        read, write = 0, 1
+        while read < write:
+            cell = queue[read]
+            read += 1
+            if cell == fruit:
+                return self.build_plan(head, fruit)
+            place = (order[cell] - start) % cells
+            for neighbour in neighbours[cell * 4:cell * 4 + 4]:
+                if seen[neighbour] != stamp and place < (order[neighbour] - start) % cells <= target:
+                    seen[neighbour] = stamp
+                    parent[neighbour] = cell
+                    queue[write] = neighbour
+                    write += 1
+        return False
+
+    def build_plan(self, head, fruit):
+        plan = []
+        cell = fruit
+        while cell != head:
+            plan.append(cell)
+            cell = self.parent[cell]
+        self.plan = plan
+        self.plan_fruit = fruit
+        return True
+
+    def free_step(self):  # Before the body lines up with the cycle, e.g. after a person has been steering
+        # Following the cycle for as many ticks as the snake is long lines the body up, so do that while it's safe,
+        # then try the shortest safe route to the fruit, then the tail
+        engine = self.engine
+        occupied = engine.occupied
+        cell = self.cycle_next(engine.head)
+        if not occupied[cell] and self.tail_distance([cell] + self.moved_body()) is not None:
+            return cell
+        cell = self.planned_step(lambda step: not occupied[step])
+        if cell is not None:
+            return cell
+        if engine.fruit is not None and self.search_free(engine.head, engine.fruit) and self.plan_is_safe():
+            return self.plan.pop()
+        self.plan = []
+        return self.chase_tail()
+
+    def search_free(self, head, fruit):  # Plain breadth first search over the empty cells
+        self.replans += 1
+        neighbours, seen, parent, queue, occupied = (
+            self.neighbours, self.seen, self.parent, self.queue, self.engine.occupied)
+        stamp = self.next_stamp()
+        queue[0] = head
+        seen[head] = stamp
+        read, write = 0, 1
+        while read < write:
+            cell = queue[read]
+            read += 1
+            if cell == fruit:
+                return self.build_plan(head, fruit)
+            for neighbour in neighbours[cell * 4:cell * 4 + 4]:
+                if seen[neighbour] != stamp and not occupied[neighbour]:
+                    seen[neighbour] = stamp
+                    parent[neighbour] = cell
+                    queue[write] = neighbour
+                    write += 1
+        return False
+
+    def plan_is_safe(self):  # Whether the tail can still be reached once the snake has followed the plan and eaten
+        engine = self.engine
+        body = self.plan[:engine.length]  # The plan runs fruit first, which is head first once it's been followed
+        body += [engine.segment(index) for index in range(engine.length - len(body))]
+        return self.tail_distance(body) is not None
+
+    def tail_distance(self, body):  # Shortest route from the head to the tail of a body, or None if it's cut off
+        neighbours, seen, blocked, queue, distance = (
+            self.neighbours, self.seen, self.blocked, self.queue, self.distance)
+        wall = self.next_stamp()
+        for cell in body:
+            blocked[cell] = wall
+        head, tail = body[0], body[-1]
+        stamp = self.next_stamp()
+        queue[0] = head
+        seen[head] = stamp
+        distance[head] = 0
+        read, write = 0, 1
+        while read < write:
+            cell = queue[read]
+            read += 1
+            for neighbour in neighbours[cell * 4:cell * 4 + 4]:
+                # The tail waits a tick while the snake grows, so it only counts if it's not right next to the head
+                if neighbour == tail and cell != head:
+                    return distance[cell] + 1
+                if seen[neighbour] != stamp and blocked[neighbour] != wall:
+                    seen[neighbour] = stamp
+                    distance[neighbour] = distance[cell] + 1
+                    queue[write] = neighbour
+                    write += 1
+        return None
+
+    def moved_body(self):  # The body behind the head after the next move, the tail staying put while it grows
+        engine = self.engine
+        kept = engine.length if engine.new_block else engine.length - 1
+        return [engine.segment(index) for index in range(kept)]
+
+    def chase_tail(self):  # The empty neighbour furthest from the tail that still leaves a way back to it
+        engine = self.engine
+        body = self.moved_body()
+        best, best_distance, fallback = None, -1, None
+        for cell in self.neighbours[engine.head * 4:engine.head * 4 + 4]:
+            if engine.occupied[cell]:
+                continue
+            fallback = cell
+            distance = self.tail_distance([cell] + body)
+            if distance is not None and distance > best_distance:
+                best, best_distance = cell, distance
+        return fallback if best is None else best
+
+
+def play(engine, autopilot, max_ticks):  # Plays until the board is full, the snake dies or the ticks run out
+    full = engine.cell_number * engine.cell_number
+    while engine.alive and engine.length < full and engine.ticks < max_ticks:
+        engine.step(autopilot.decide())
+    return engine.length == full
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak tests the autopilot and reports its decision rate")
+    parser.add_argument("--games", type=int, default=10)
+    parser.add_argument("--cells", type=int, default=CELL_NUMBER)
+    parser.add_argument("--max-ticks", type=int, default=1000000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    seeds = random.Random(args.seed)
+    engine = SnakeEngine(args.cells, seeds.randrange(2 ** 32))
+    autopilot = Autopilot(engine)
+    filled = deaths = ticks = 0
+    start = time.perf_counter()
+    for _ in range(args.games):
+        engine.reset(seeds.randrange(2 ** 32))
+        autopilot.reset()
+        filled += play(engine, autopilot, args.max_ticks)
+        deaths += not engine.alive
+        ticks += engine.ticks
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.games} games on {args.cells}x{args.cells}: {filled} filled the board, {deaths} died")
+    print(f"{ticks} ticks, {autopilot.decisions} decisions, {autopilot.replans} searches in {elapsed:.2f}s")
+    print(f"{autopilot.decisions / elapsed:.0f} decisions/sec including the engine, "
+          f"{elapsed / autopilot.decisions * 1e6:.2f} us per tick")
+
+
+if __name__ == '__main__':
+    main()
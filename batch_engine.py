@@ -0,0 +1,342 @@
+import argparse
+import random
+import time
+from array import array
+
+import numpy as np
+
+from engine import CELL_NUMBER, LINK_CODES, LINK_DIRECTIONS, ATE, DIED, SnakeEngine
+
+# Directions are their link codes, so reversing one flips its low bit and an action of -1 keeps going straight
+NO_TURN = -1
+STEP_X = np.array([dx for dx, _ in LINK_DIRECTIONS], np.int32)
+STEP_Y = np.array([dy for _, dy in LINK_DIRECTIONS], np.int32)
+
+# Observation channels, each a cell_number x cell_number grid of 0s and 1s
+BODY, HEAD, FRUIT = range(3)
+CHANNELS = 3
+
+# Every board runs its own copy of the Mersenne Twister behind Python's random, drawn from exactly the way
+# random.randrange draws, so a board plays out the same game a SnakeEngine with its seed would and can be replayed
+MT_N = 624
+MT_M = 397
+MATRIX_A = np.uint32(0x9908B0DF)
+UPPER = np.uint32(0x80000000)
+LOWER = np.uint32(0x7FFFFFFF)
+SEED_BATCH = 128  # Fewer generators than this are seeded one at a time by random itself, which is quicker for a few
+
+
+def init_genrand(seed):  # The twister's state for a single integer seed, the starting point for seeding from a key
+    state = [seed]
+    for index in range(1, MT_N):
+        state.append((1812433253 * (state[-1] ^ state[-1] >> 30) + index) & 0xFFFFFFFF)
+    return state
+
+
+SEED_BASE = np.array(init_genrand(19650218), np.uint32)
+
+
+def seeded_states(seeds):  # The state random.seed() leaves for each 32 bit seed, one row per seed
+    if len(seeds) < SEED_BATCH:
+        states = np.empty((len(seeds), MT_N), np.uint32)
+        for row, seed in enumerate(seeds):
+            states[row] = array("I", random.Random(int(seed)).getstate()[1][:MT_N])
+        return states
+
+    # init_by_array with a one word key, run down the state for every seed at once
+    state = np.repeat(SEED_BASE[:, None], len(seeds), axis=1)
+    key = np.asarray(seeds, np.uint32)
+    scratch = np.empty_like(key)
+    index = 1
+    for multiplier, count in ((np.uint32(1664525), MT_N), (np.uint32(1566083941), MT_N - 1)):
+        for _ in range(count):
+            previous = state[index - 1]
+            np.right_shift(previous, 30, out=scratch)
+            scratch ^= previous
+            scratch *= multiplier
+            row = state[index]
+            row ^= scratch
+            if count == MT_N:
+                row += key
+            else:
+                row -= np.uint32(index)
+            index += 1
+            if index >= MT_N:
+                state[0] = state[MT_N - 1]
+                index = 1
+    state[0] = UPPER
+    return np.ascontiguousarray(state.T)
+
+
+def twist(state):  # Refills each row of 624 words, in the four runs where no word needs one changed in the same run
+    def mix(start, end, far):
+        y = state[:, start:end] & UPPER | state[:, start + 1:end + 1] & LOWER
+        state[:, start:end] = far ^ y >> 1 ^ (y & 1) * MATRIX_A
+
+    gap = MT_N - MT_M
+    mix(0, gap, state[:, MT_M:])
+    mix(gap, 2 * gap, state[:, :gap])
+    mix(2 * gap, MT_N - 1, state[:, gap:MT_M - 1])
+    y = state[:, MT_N - 1] & UPPER | state[:, 0] & LOWER
+    state[:, MT_N - 1] = state[:, MT_M - 1] ^ y >> 1 ^ (y & 1) * MATRIX_A
+
+
+class BatchEngine:  # Many boards of SnakeEngine rules in NumPy arrays, every one of them stepped at once
+    def __init__(self, boards, cell_number=CELL_NUMBER, seed=None, max_ticks=None):
+        self.boards = boards
+        self.cell_number = n = cell_number
+        self.cell_count = cells = n * n
+        self.capacity = capacity = cells + 1
+        self.max_ticks = max_ticks  # Games still going after this many ticks are cut short and restarted
+        self.rows = np.arange(boards)
+
+        # The same layout as SnakeEngine, one row per board; the flat views and row offsets let a single fancy
+        # index touch one cell on every board
+        self.ring = np.zeros((boards, capacity), np.int32)
+        self.occupied = np.zeros((boards, cells), np.uint8)
+        self.free = np.zeros((boards, cells), np.int32)
+        self.free_index = np.zeros((boards, cells), np.int32)
+        self.ring_flat, self.occupied_flat = self.ring.reshape(-1), self.occupied.reshape(-1)
+        self.free_flat, self.free_index_flat = self.free.reshape(-1), self.free_index.reshape(-1)
+        self.ring_rows = self.rows * capacity
+        self.cell_rows = self.rows * cells
+        self.free_count = np.zeros(boards, np.int32)
+        self.head_index = np.zeros(boards, np.int32)
+        self.length = np.zeros(boards, np.int32)
+        self.direction = np.zeros(boards, np.int32)
+        self.new_block = np.zeros(boards, bool)
+        self.fruit = np.zeros(boards, np.int32)  # -1 on a full board
+        self.score = np.zeros(boards, np.int32)
+        self.ticks = np.zeros(boards, np.int32)
+        self.seed = np.zeros(boards, np.uint32)
+        self.final_score = np.zeros(boards, np.int32)  # What each board's last finished game scored
+        self.games = 0  # Games finished across every board
+
+        self.state = np.zeros((boards, MT_N), np.uint32)
+        self.state_flat = self.state.reshape(-1)
+        self.state_rows = self.rows * MT_N
+        self.state_index = np.zeros(boards, np.int32)
+        self.bit_lengths = np.array([count.bit_length() for count in range(cells + 1)], np.uint32)
+
+        # Every game starts the same way, so a new one is copied from a SnakeEngine that's just been reset
+        start = SnakeEngine(n, 0)
+        self.start_ring = np.array(start.ring, np.int32)
+        self.start_occupied = np.array(start.occupied, np.uint8)
+        self.start_free = np.zeros(cells, np.int32)
+        self.start_free[:len(start.free)] = start.free
+        self.start_free_index = np.array(start.free_index, np.int32)
+        self.start = (len(start.free), start.head_index, start.length, LINK_CODES[start.direction])
+
+        rng = random.Random(seed)  # Each board's first seed, drawn the way batch_runner draws them
+        self.reset(self.rows, np.array([rng.randrange(2 ** 32) for _ in range(boards)], np.uint32))
+
+    @property
+    def heads(self):
+        return self.ring_flat[self.ring_rows + self.head_index]
+
+    def cells(self, board):  # One board's body from head to tail, as SnakeEngine.cells() would give it
+        offsets = (self.head_index[board] + np.arange(self.length[board])) % self.capacity
+        return self.ring[board, offsets].tolist()
+
+    def reset(self, rows, seeds=None):  # Starts new games on the given boards, seeded from their last if not given
+        if seeds is None:
+            seeds = self.random_seeds(rows)
+        self.seed[rows] = seeds
+        self.state[rows] = seeded_states(seeds)
+        self.state_index[rows] = MT_N
+        self.ring[rows] = self.start_ring
+        self.occupied[rows] = self.start_occupied
+        self.free[rows] = self.start_free
+        self.free_index[rows] = self.start_free_index
+        free_count, head_index, length, direction = self.start
+        self.free_count[rows] = free_count
+        self.head_index[rows] = head_index
+        self.length[rows] = length
+        self.direction[rows] = direction
+        self.new_block[rows] = False
+        self.score[rows] = 0
+        self.ticks[rows] = 0
+        self.place_fruit(rows)
+
+    def step(self, actions=None):  # Advances every board a tick, returns (observations, ate, died) per board
+        # Finished boards start their next game straight away, so the observation is already of the new one
+        if actions is not None:
+            actions = np.asarray(actions)
+            turning = (actions >= 0) & (actions != self.direction ^ 1)
+            np.copyto(self.direction, actions, where=turning, casting="unsafe")
+        self.ticks += 1
+        n, capacity = self.cell_number, self.capacity
+
+        y, x = np.divmod(self.heads, n)
+        head = (y + STEP_Y[self.direction]) % n * n + (x + STEP_X[self.direction]) % n
+
+        # Tails leave before heads arrive, so a head can follow straight into the cell its tail just left
+        moving = np.flatnonzero(~self.new_block)
+        self.new_block[:] = False
+        self.length[moving] -= 1
+        tail = self.ring_flat[self.ring_rows[moving] + (self.head_index[moving] + self.length[moving]) % capacity]
+        spots = self.cell_rows[moving] + tail
+        self.occupied_flat[spots] -= 1
+        emptied = self.occupied_flat[spots] == 0
+        self.release(moving[emptied], tail[emptied])
+
+        self.head_index -= 1
+        self.head_index %= capacity
+        self.ring_flat[self.ring_rows + self.head_index] = head
+        self.length += 1
+        spots = self.cell_rows + head
+        entered = np.flatnonzero(self.occupied_flat[spots] == 0)
+        self.claim(entered, head[entered])
+        self.occupied_flat[spots] += 1
+
+        ate = head == self.fruit
+        eaten = np.flatnonzero(ate)
+        self.new_block[eaten] = True
+        self.score[eaten] += 1
+        self.place_fruit(eaten)
+
+        died = self.occupied_flat[spots] > 1
+        finished = died if self.max_ticks is None else died | (self.ticks >= self.max_ticks)
+        done = np.flatnonzero(finished)
+        if len(done):
+            self.final_score[done] = self.score[done]
+            self.games += len(done)
+            self.reset(done)
+        return self.observe(), ate, died
+
+    def observe(self):  # The boards as a (boards, CHANNELS, cell_number, cell_number) array of 0s and 1s
+        cells = self.cell_count
+        observations = np.zeros((self.boards, CHANNELS, cells), np.uint8)
+        observations[:, BODY] = self.occupied
+        flat = observations.reshape(-1)
+        rows = self.rows * (CHANNELS * cells)
+        flat[rows + HEAD * cells + self.heads] = 1
+        placed = np.flatnonzero(self.fruit >= 0)
+        flat[rows[placed] + FRUIT * cells + self.fruit[placed]] = 1
+        return observations.reshape(self.boards, CHANNELS, self.cell_number, self.cell_number)
+
+    def claim(self, rows, cells):  # SnakeEngine.claim on one cell per board, the last free cell filling its slot
+        offsets = self.cell_rows[rows]
+        index = self.free_index_flat[offsets + cells]
+        self.free_count[rows] -= 1
+        last = self.free_flat[offsets + self.free_count[rows]]
+        self.free_flat[offsets + index] = last
+        self.free_index_flat[offsets + last] = index
+        self.free_index_flat[offsets + cells] = -1
+
+    def release(self, rows, cells):  # SnakeEngine.release on one cell per board
+        offsets = self.cell_rows[rows]
+        self.free_index_flat[offsets + cells] = self.free_count[rows]
+        self.free_flat[offsets + self.free_count[rows]] = cells
+        self.free_count[rows] += 1
+
+    def place_fruit(self, rows):  # Picks a slot in each board's free array, as SnakeEngine.place_fruit does
+        self.fruit[rows] = -1
+        rows = rows[self.free_count[rows] > 0]
+        slots = self.randbelow(rows, self.free_count[rows])
+        self.fruit[rows] = self.free_flat[self.cell_rows[rows] + slots]
+
+    def genrand(self, rows):  # The next 32 bit word from each board's generator, rows must not repeat
+        spent = rows[self.state_index[rows] >= MT_N]
+        if len(spent):
+            state = self.state[spent]
+            twist(state)
+            self.state[spent] = state
+            self.state_index[spent] = 0
+        y = self.state_flat[self.state_rows[rows] + self.state_index[rows]]
+        self.state_index[rows] += 1
+        y ^= y >> 11
+        y ^= y << 7 & np.uint32(0x9D2C5680)
+        y ^= y << 15 & np.uint32(0xEFC60000)
+        return y ^ y >> 18
+
+    def randbelow(self, rows, limits):  # random.randrange(limit) for each board: the top bits, tried until in range
+        shifts = 32 - self.bit_lengths[limits]
+        values = np.empty(len(rows), np.int64)
+        pending = np.arange(len(rows))
+        while len(pending):
+            drawn = self.genrand(rows[pending]) >> shifts[pending]
+            good = drawn < limits[pending]
+            values[pending[good]] = drawn[good]
+            pending = pending[~good]
+        return values
+
+    def random_seeds(self, rows):  # random.randrange(2 ** 32) for each board, which draws 33 bits at a time
+        seeds = np.empty(len(rows), np.uint32)
+        pending = np.arange(len(rows))
+        while len(pending):
+            low = self.genrand(rows[pending])
+            good = self.genrand(rows[pending]) >> 31 == 0
+            seeds[pending[good]] = low[good]
+            pending = pending[~good]
+        return seeds
+
+
+def check(boards, cell_number, ticks, seed, max_ticks):  # Plays a SnakeEngine beside every board, returns any mismatch
+    batch = BatchEngine(boards, cell_number, seed, max_ticks)
+    engines = [SnakeEngine(cell_number, int(board_seed)) for board_seed in batch.seed]
+    rng = np.random.default_rng(seed)
+    for tick in range(ticks):
+        actions = rng.integers(NO_TURN, 4, boards)
+        observations, ate, died = batch.step(actions)
+        heads = batch.heads
+        for board, engine in enumerate(engines):
+            action = actions[board]
+            events = engine.step(None if action == NO_TURN else LINK_DIRECTIONS[action])
+            if (ATE in events, DIED in events) != (ate[board], died[board]):
+                return f"tick {tick}, board {board}: engine {events}, batch ate {ate[board]} died {died[board]}"
+            if not engine.alive or max_ticks is not None and engine.ticks >= max_ticks:
+                engine.reset()
+            fruit = -1 if engine.fruit is None else engine.fruit
+            expected = (engine.seed, engine.head, fruit, engine.score, engine.length, engine.ticks)
+            actual = (batch.seed[board], heads[board], batch.fruit[board], batch.score[board], batch.length[board],
+                      batch.ticks[board])
+            if expected != actual or bytes(engine.occupied) != batch.occupied[board].tobytes():
+                return f"tick {tick}, board {board}: engine {expected}, batch {actual}"
+            if observations[board, BODY].sum() != engine.length or \
+                    observations[board, HEAD].reshape(-1)[engine.head] != 1:
+                return f"tick {tick}, board {board}: observation doesn't match the engine"
+    for board, engine in enumerate(engines):
+        if list(engine.cells()) != batch.cells(board):
+            return f"board {board}: bodies differ at the end"
+    return None
+
+
+def bench(boards, cell_number, ticks, seed, max_ticks):  # Steps every board with random turns and reports the rate
+    batch = BatchEngine(boards, cell_number, seed, max_ticks)
+    rng = np.random.default_rng(seed)
+    actions = rng.integers(NO_TURN, 4, (ticks, boards))
+    start = time.perf_counter()
+    for tick in range(ticks):
+        batch.step(actions[tick])
+    elapsed = time.perf_counter() - start
+    return batch, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Steps many boards at once with NumPy, for training and "
+                                                 "evaluating bots")
+    parser.add_argument("--boards", type=int, default=4096)
+    parser.add_argument("--cells", type=int, default=CELL_NUMBER)
+    parser.add_argument("--ticks", type=int, default=1000, help="Ticks to step every board")
+    parser.add_argument("--max-ticks", type=int, default=None, help="Restart games that run this long")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--check", action="store_true", help="Play a SnakeEngine beside every board and stop at "
+                                                             "the first tick they disagree")
+    args = parser.parse_args()
+
+    if args.check:
+        start = time.perf_counter()
+        mismatch = check(args.boards, args.cells, args.ticks, args.seed, args.max_ticks)
+        print(f"checked {args.boards} boards for {args.ticks} ticks in {time.perf_counter() - start:.1f}s: "
+              f"{mismatch or 'identical to SnakeEngine'}")
+        raise SystemExit(1 if mismatch else 0)
+
+    batch, elapsed = bench(args.boards, args.cells, args.ticks, args.seed, args.max_ticks)
+    board_ticks = args.boards * args.ticks
+    print(f"{args.boards} boards of {args.cells}x{args.cells}, {args.ticks} ticks in {elapsed:.2f}s: "
+          f"{board_ticks / elapsed:,.0f} board-ticks/sec, {batch.games} games finished")
+
+
+if __name__ == '__main__':
+    main()
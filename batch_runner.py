@@ -0,0 +1,100 @@
+import argparse
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from engine import CELL_NUMBER, NORTH, SOUTH, EAST, WEST, SnakeEngine, board_size
+
+DIRECTIONS = (NORTH, SOUTH, EAST, WEST)
+
+
+def random_policy(engine, rng):  # Wanders about, turning now and then
+    if rng.random() < 0.2:
+        return rng.choice(DIRECTIONS)
+    return None
+
+
+def greedy_policy(engine, rng):  # Heads straight for the fruit, with the odd random turn so it doesn't loop forever
+    if rng.random() < 0.05:
+        return rng.choice(DIRECTIONS)
+    if engine.fruit is None:  # The board is full, so there is nothing to head for
+        return None
+    head_x, head_y = engine.position(engine.head)
+    fruit_x, fruit_y = engine.position(engine.fruit)
+    if fruit_x != head_x:
+        return EAST if fruit_x > head_x else WEST
+    if fruit_y != head_y:
+        return SOUTH if fruit_y > head_y else NORTH
+    return None
+
+
+POLICIES = {"random": random_policy, "greedy": greedy_policy}
+
+
+def play_games(games, cell_number, max_ticks, seed, policy_name):  # Plays a chunk of games and totals them up
+    policy = POLICIES[policy_name]
+    rng = random.Random(seed)
+    total_ticks = 0
+    total_score = 0
+    for _ in range(games):
+        engine = SnakeEngine(cell_number, seed=rng.randrange(2 ** 32))
+        while engine.alive and engine.ticks < max_ticks:
+            engine.step(policy(engine, rng))
+        total_ticks += engine.ticks
+        total_score += engine.score
+    return games, total_ticks, total_score
+
+
+def run_batch(games, cell_number=CELL_NUMBER, max_ticks=5000, seed=0, policy="greedy", workers=None,
+              chunk_size=1000):  # Spreads the games across every CPU core and reports throughput
+    workers = workers or os.cpu_count() or 1
+    seeds = random.Random(seed)
+    chunks = []
+    remaining = games
+    while remaining > 0:
+        size = min(chunk_size, remaining)
+        chunks.append(size)
+        remaining -= size
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(play_games, size, cell_number, max_ticks, seeds.randrange(2 ** 32), policy)
+                   for size in chunks]
+        results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+
+    total_games = sum(result[0] for result in results)
+    total_ticks = sum(result[1] for result in results)
+    total_score = sum(result[2] for result in results)
+    return {
+        "games": total_games,
+        "ticks": total_ticks,
+        "mean_score": total_score / total_games if total_games else 0,
+        "seconds": elapsed,
+        "games_per_sec": total_games / elapsed,
+        "ticks_per_sec": total_ticks / elapsed,
+        "workers": workers,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plays headless games of snake as fast as the CPU allows")
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--cells", type=board_size, default=CELL_NUMBER)
+    parser.add_argument("--max-ticks", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="greedy")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    report = run_batch(args.games, args.cells, args.max_ticks, args.seed, args.policy, args.workers, args.chunk_size)
+    print(f"{report['games']} games, {report['ticks']} ticks in {report['seconds']:.2f}s "
+          f"on {report['workers']} workers")
+    print(f"{report['games_per_sec']:.0f} games/sec, {report['ticks_per_sec']:.0f} ticks/sec, "
+          f"mean score {report['mean_score']:.2f}")
+
+
+if __name__ == '__main__':
+    main()
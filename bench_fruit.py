@@ -0,0 +1,55 @@
+import argparse
+import time
+
+from engine import SnakeEngine
+
+FILL_RATIOS = (0.0, 0.5, 0.9, 0.99, 0.999)
+
+
+def fill_board(engine, ratio):  # Lays the snake back and forth across the board until it covers the given share of it
+    n = engine.cell_number
+    target = min(int(n * n * ratio), n * n - 1)
+    for cell in list(engine.cells()):
+        engine.pop_tail()
+    for index in range(max(target, 1)):
+        y, x = divmod(index, n)
+        if y % 2:
+            x = n - 1 - x
+        engine.push_head(engine.cell(x, y))
+
+
+def rejection_sample(engine):  # The old way: keep rolling random cells until one is empty
+    cells = engine.cell_number * engine.cell_number
+    randrange, occupied = engine.rng.randrange, engine.occupied
+    cell = randrange(cells)
+    while occupied[cell]:
+        cell = randrange(cells)
+    return cell
+
+
+def time_placements(place, placements):
+    start = time.perf_counter()
+    for _ in range(placements):
+        place()
+    return (time.perf_counter() - start) / placements * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Times fruit placement at several board fill ratios")
+    parser.add_argument("--cells", type=int, nargs="+", default=[25, 100])
+    parser.add_argument("--placements", type=int, default=100000)
+    args = parser.parse_args()
+
+    print(f"{'board':>9} {'fill':>7} {'free':>7} {'free index ns':>14} {'rejection ns':>13}")
+    for cell_number in args.cells:
+        engine = SnakeEngine(cell_number, seed=0)
+        for ratio in FILL_RATIOS:
+            fill_board(engine, ratio)
+            indexed = time_placements(engine.place_fruit, args.placements)
+            rejection = time_placements(lambda: rejection_sample(engine), args.placements)
+            print(f"{cell_number:>4}x{cell_number:<4} {ratio:>7.1%} {len(engine.free):>7} {indexed:>14.0f} "
+                  f"{rejection:>13.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+from engine import EAST, SOUTH
+from main import BOARD_SIZE, Game
+from scheduler import percentile
+
+CELL_NUMBERS = (25, 100, 500)
+FILLS = (0.0, 0.1, 0.5, 0.99)  # Snake length as a share of the board, never shorter than the usual 3
+SCALES = (0.5, 1.0, 1.5)  # Window size relative to the 1000 pixel layout
+MODES = ("incremental", "full")
+PHASES = ("tick", "draw", "present")
+
+
+def cycle_direction(index, n):  # On a wrapping board, n - 1 steps east then one south visits every cell once
+    return SOUTH if index % n == n - 1 else EAST
+
+
+def lay_snake(engine, length):  # Lays the snake along that cycle, so it can follow it forever without crashing
+    n = engine.cell_number
+    engine.reset(seed=0)
+    while engine.length:
+        engine.pop_tail()
+    x, y = 0, 0
+    for index in range(length):
+        engine.push_head(engine.cell(x, y))
+        dx, dy = cycle_direction(index, n)
+        x, y = (x + dx) % n, (y + dy) % n
+    engine.turn(cycle_direction(length - 1, n))
+    engine.place_fruit()
+    return length - 1  # The head's place on the cycle
+
+
+def run(game, length, mode, ticks):  # Times each phase of a tick-and-frame, holding the snake at the given length
+    engine = game.engine
+    position = lay_snake(engine, length)
+    game.score = 0
+    game.snake.alpha = 1.0
+    game.dirty.state = None
+    game.dirty.invalidate()
+    game.present(game.draw_changes())
+
+    timings = {phase: [] for phase in PHASES}
+    for _ in range(ticks):
+        start = time.perf_counter()
+        game.update()
+        engine.new_block = False  # Eating still scores and moves the fruit, but the snake keeps its length
+        ticked = time.perf_counter()
+        rects = game.draw_changes() if mode == "incremental" else game.redraw()
+        drawn = time.perf_counter()
+        game.present(rects)
+        presented = time.perf_counter()
+        pygame.event.pump()
+
+        timings["tick"].append(ticked - start)
+        timings["draw"].append(drawn - ticked)
+        timings["present"].append(presented - drawn)
+        position += 1
+        engine.turn(cycle_direction(position, engine.cell_number))
+    if not engine.alive:
+        raise RuntimeError(f"snake crashed on a {engine.cell_number} cell board at length {length}")
+
+    result = {}
+    for phase, samples in timings.items():
+        micros = [sample * 1e6 for sample in samples]
+        result[phase] = {
+            "mean_us": sum(micros) / len(micros),
+            "p50_us": percentile(micros, 0.5),
+            "p99_us": percentile(micros, 0.99),
+        }
+    return result
+
+
+def run_suite(cell_numbers, fills, scales, modes, ticks):
+    results = []
+    for cell_number in cell_numbers:
+        for scale in scales:
+            size = round(BOARD_SIZE * scale)
+            game = Game(seed=0, cell_number=cell_number, window_size=(size, size))
+            game.running = game.game_active = True
+            for fill in fills:
+                length = min(max(3, int(cell_number * cell_number * fill)), cell_number * cell_number - 1)
+                for mode in modes:
+                    phases = run(game, length, mode, ticks)
+                    results.append({"cells": cell_number, "length": length, "scale": scale, "mode": mode,
+                                    "window": list(game.SCREEN_DIMENSIONS), "phases": phases})
+                    print(f"{cell_number:>5} {length:>7} {scale:>6} {mode:>12} " + " ".join(
+                        f"{phases[phase]['p50_us']:>10.1f}" for phase in PHASES), flush=True)
+    return results
+
+
+def key(result):
+    return result["cells"], result["length"], result["scale"], result["mode"]
+
+
+def compare(results, baseline, threshold, floor):  # Every phase whose median slowed by more than the allowance
+    previous = {key(result): result for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        old = previous.get(key(result))
+        if old is None:
+            continue
+        for phase in PHASES:
+            before, after = old["phases"][phase]["p50_us"], result["phases"][phase]["p50_us"]
+            if after > before * (1 + threshold) and after - before > floor:
+                regressions.append((key(result), phase, before, after))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Times the tick, draw and present phases across board sizes, "
+                                                 "snake lengths and window sizes")
+    parser.add_argument("--cells", type=int, nargs="+", default=list(CELL_NUMBERS))
+    parser.add_argument("--fills", type=float, nargs="+", default=list(FILLS))
+    parser.add_argument("--scales", type=float, nargs="+", default=list(SCALES))
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--ticks", type=int, default=60, help="Ticks timed for each combination")
+    parser.add_argument("--output", help="Save the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against results saved earlier with --output")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Slowdown allowed before flagging, 0.1 = 10%%")
+    parser.add_argument("--floor", type=float, default=5.0, help="Ignore slowdowns under this many microseconds")
+    args = parser.parse_args()
+
+    header = " ".join(f"{phase + ' us':>10}" for phase in PHASES)
+    print(f"{'cells':>5} {'length':>7} {'scale':>6} {'mode':>12} {header}")
+    results = run_suite(args.cells, args.fills, args.scales, args.modes, args.ticks)
+    pygame.quit()
+
+    report = {
+        "python": platform.python_version(),
+        "pygame": pygame.version.ver,
+        "platform": platform.platform(),
+        "ticks": args.ticks,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=1)
+
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            regressions = compare(results, json.load(baseline), args.threshold, args.floor)
+        for (cells, length, scale, mode), phase, before, after in regressions:
+            print(f"REGRESSION {cells} cells, length {length}, scale {scale}, {mode}: {phase} "
+                  f"{before:.1f}us -> {after:.1f}us ({after / before - 1:+.0%})")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+import argparse
+import os
+import random
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+from main import Game
+
+SPEEDS = {"Easy": 150, "Medium": 100, "Hard": 50, "2020": 10}
+ARROWS = (pygame.K_UP, pygame.K_DOWN, pygame.K_LEFT, pygame.K_RIGHT)
+
+
+class BenchGame(Game):  # Restarts straight away on a crash instead of waiting on the game over screen
+    def __init__(self, seed):
+        super().__init__(seed)
+        self.running = True
+        self.game_active = True
+        self.deaths = 0
+
+    def game_over_screen(self):
+        self.deaths += 1
+        self.game_clear()
+        self.resume_play()
+
+
+def run(game, fixed_timestep, speed, seconds, rng):  # Plays for a while with bursts of key presses and reports timings
+    game.fixed_timestep = fixed_timestep
+    game.set_game_speed(speed)
+    game.timing.clear()
+    game.resume_play()
+    game.deaths = 0
+
+    end = time.perf_counter() + seconds
+    next_press = time.perf_counter()
+    while time.perf_counter() < end:
+        if time.perf_counter() >= next_press:
+            # Two presses in quick succession, the way a player turns a corner
+            for key in rng.sample(ARROWS, 2):
+                pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=key))
+            next_press = time.perf_counter() + rng.uniform(0.1, 0.4)
+        game.play_frame()
+
+    report = game.timing.report(speed)
+    report["deaths"] = game.deaths
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares tick jitter and input latency of the two schedulers")
+    parser.add_argument("--seconds", type=float, default=5.0, help="How long to play each speed with each scheduler")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    game = BenchGame(args.seed)
+    rng = random.Random(args.seed)
+    print(f"{'speed':>8} {'scheduler':>10} {'ticks':>6} {'jitter p50':>11} {'jitter p99':>11} "
+          f"{'latency p50':>12} {'latency p99':>12} {'lost':>5} {'deaths':>7}")
+    for name, speed in SPEEDS.items():
+        for label, fixed_timestep in (("timer", False), ("fixed", True)):
+            report = run(game, fixed_timestep, speed, args.seconds, rng)
+            print(f"{name:>8} {label:>10} {report['ticks']:>6} {report['jitter_p50']:>9.2f}ms "
+                  f"{report['jitter_p99']:>9.2f}ms {report['latency_p50']:>10.2f}ms {report['latency_p99']:>10.2f}ms "
+                  f"{report['lost']:>5} {report['deaths']:>7}")
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+import argparse
+import io
+import json
+import mmap
+import os
+import struct
+import zlib
+
+import pygame
+
+MAGIC = b"SNAKEBDL"
+VERSION = 1
+HEADER = struct.Struct("<8sII")  # Magic, version, length of the JSON index that follows
+ALIGNMENT = 16
+BUNDLE_PATH = "assets.bundle"
+ASSET_DIRS = ("Graphics", "Sound", "Font")
+IMAGE_EXTENSIONS = (".png", ".jpg", ".bmp")
+
+
+def build_bundle(output=BUNDLE_PATH, asset_dirs=ASSET_DIRS):  # Packs every asset into one file, images pre-decoded
+    entries = {}
+    blobs = []
+    for directory in asset_dirs:
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            path = f"{directory}/{name}"
+            with open(path, "rb") as source:
+                data = source.read()
+            entry = {"crc": zlib.crc32(data)}
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                image = pygame.image.load(path)
+                entry["kind"] = "image"
+                entry["size"] = list(image.get_size())
+                data = pygame.image.tostring(image, "RGBA")
+            else:
+                entry["kind"] = "raw"
+            entries[path] = entry
+            blobs.append((path, data))
+
+    # Offsets depend on the index's length and the index holds the offsets, so lay it out until it settles
+    data_start = 0
+    while True:
+        offset = data_start
+        for path, data in blobs:
+            entries[path]["offset"] = offset
+            entries[path]["length"] = len(data)
+            offset += -(-len(data) // ALIGNMENT) * ALIGNMENT
+        index = json.dumps(entries, sort_keys=True).encode()
+        needed = -(-(HEADER.size + len(index)) // ALIGNMENT) * ALIGNMENT
+        if needed == data_start:
+            break
+        data_start = needed
+
+    with open(output, "wb") as bundle:
+        bundle.write(HEADER.pack(MAGIC, VERSION, len(index)))
+        bundle.write(index)
+        bundle.write(b"\0" * (data_start - HEADER.size - len(index)))
+        for path, data in blobs:
+            bundle.write(data)
+            bundle.write(b"\0" * (-len(data) % ALIGNMENT))
+    return entries
+
+
+class FileSource:  # Loads assets straight from the loose files in Graphics/, Sound/ and Font/
+    def image(self, path):
+        return pygame.image.load(path)
+
+    def sound(self, path):
+        return pygame.mixer.Sound(path)
+
+    def music(self, path):  # Something mixer.music can stream from
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        return path
+
+    def font(self, path, size):
+        return pygame.font.Font(path, size)
+
+    def checksum(self, path):
+        with open(path, "rb") as source:
+            return zlib.crc32(source.read())
+
+
+class BundleSource:  # Loads assets out of a memory-mapped bundle, with images already decoded to raw pixels
+    def __init__(self, path=BUNDLE_PATH):
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, index_length = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} asset bundle")
+        self.entries = json.loads(self.map[HEADER.size:HEADER.size + index_length])
+        self.view = memoryview(self.map)
+        self.font_files = []  # Fonts read from their file object for as long as they live, so keep those around
+
+    def data(self, path):
+        entry = self.entries[path]
+        return self.view[entry["offset"]:entry["offset"] + entry["length"]]
+
+    def image(self, path):  # Wraps the mapped pixels without copying them, convert() makes the real copy
+        return pygame.image.frombuffer(self.data(path), tuple(self.entries[path]["size"]), "RGBA")
+
+    def sound(self, path):
+        if path not in self.entries:
+            raise FileNotFoundError(path)
+        return pygame.mixer.Sound(file=io.BytesIO(self.data(path)))
+
+    def music(self, path):  # Only the compressed track is copied out, mixer.music decodes it as it plays
+        if path not in self.entries:
+            raise FileNotFoundError(path)
+        return io.BytesIO(self.data(path))
+
+    def font(self, path, size):
+        font_file = io.BytesIO(self.data(path))
+        self.font_files.append(font_file)
+        return pygame.font.Font(font_file, size)
+
+    def checksum(self, path):
+        return self.entries[path]["crc"]
+
+
+def open_source(path=BUNDLE_PATH):  # Uses the bundle when one has been built, the loose files otherwise
+    if os.path.exists(path):
+        try:
+            return BundleSource(path)
+        except (OSError, ValueError):
+            pass
+    return FileSource()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Packs Graphics/, Sound/ and Font/ into one memory-mappable bundle")
+    parser.add_argument("--output", default=BUNDLE_PATH)
+    args = parser.parse_args()
+
+    entries = build_bundle(args.output)
+    print(f"Packed {len(entries)} assets into {args.output} ({os.path.getsize(args.output)} bytes)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+import argparse
+import random
+from array import array
+
+CELL_NUMBER = 25
+MIN_CELLS = 6  # The starting snake lies across x = 3 to 5, so anything narrower has it overlap itself
+
+# Directions
+NORTH = (0, -1)
+SOUTH = (0, 1)
+EAST = (1, 0)
+WEST = (-1, 0)
+OPPOSITE = {NORTH: SOUTH, SOUTH: NORTH, EAST: WEST, WEST: EAST}
+
+# Each segment keeps the way to its neighbours as direction codes, their index here, with the segment behind in the
+# low two bits and the one ahead in the next two, so drawing can pick its sprite without looking at the neighbours.
+# Flipping the low bit of a code reverses it
+LINK_DIRECTIONS = (NORTH, SOUTH, EAST, WEST)
+LINK_CODES = {direction: code for code, direction in enumerate(LINK_DIRECTIONS)}
+
+# Events returned by SnakeEngine.step
+ATE = "ate"
+DIED = "died"
+
+
+def link_code(cell_number, start, end):  # The code of the direction from a cell to the one next to it, wrapping
+    start_y, start_x = divmod(start, cell_number)
+    end_y, end_x = divmod(end, cell_number)
+    if start_x == end_x:
+        return 1 if (end_y - start_y) % cell_number == 1 else 0
+    return 2 if (end_x - start_x) % cell_number == 1 else 3
+
+
+def board_size(text):  # An argparse type for a --cells option, turning down boards too small to start on
+    cell_number = int(text)
+    if cell_number < MIN_CELLS:
+        raise argparse.ArgumentTypeError(f"boards need at least {MIN_CELLS} cells across, not {cell_number}")
+    return cell_number
+
+
+class SnakeEngine:  # The game rules with no pygame in sight, so they can run headless at full CPU speed
+    def __init__(self, cell_number=CELL_NUMBER, seed=None):
+        if cell_number < MIN_CELLS:
+            raise ValueError(f"boards need at least {MIN_CELLS} cells across, not {cell_number}")
+        self.cell_number = cell_number
+        self.rng = random.Random(seed)
+
+        # The body is a ring buffer of cell indices (y * cell_number + x) running from the head to the tail,
+        # with a count of segments per cell kept alongside so "is anything here?" never walks the body
+        self.capacity = cell_number * cell_number + 1
+        self.ring = array("i", [0]) * self.capacity
+        self.occupied = bytearray(cell_number * cell_number)
+        self.slot = array("i", [0]) * (cell_number * cell_number)  # Where in the ring each occupied cell's segment is
+        self.links = bytearray(self.capacity)  # Each segment's link codes, alongside its cell in the ring
+
+        # Every empty cell sits in the free array, with each cell's slot in it (or -1) kept in free_index, so a
+        # cell can be swapped out or appended back in constant time and the fruit can pick from it directly
+        self.free = array("i", range(cell_number * cell_number))
+        self.free_index = array("i", range(cell_number * cell_number))
+        self.head_index = 0
+        self.length = 0
+        self.reset(seed)
+
+    def reset(self, seed=None):  # Puts the snake back at the start and places a fresh fruit
+        # Every game gets its own seed, drawn from the last game's if none is given, so a game can be replayed
+        # from its seed and its turns alone
+        self.seed = self.rng.randrange(2 ** 32) if seed is None else seed
+        self.rng.seed(self.seed)
+        for cell in self.cells():
+            self.occupied[cell] = 0
+        # The fruit is picked by its slot in the free array, so the array goes back to its starting order too
+        cells = self.cell_number * self.cell_number
+        self.free[:] = array("i", range(cells))
+        self.free_index[:] = array("i", range(cells))
+        self.head_index = 0
+        self.length = 0
+        for position in ((3, 2), (4, 2), (5, 2)):
+            self.push_head(self.cell(*position))
+        self.direction = EAST
+        self.new_block = False
+        self.vacated = None  # The cell the tail left on the last move, if it moved
+        self.alive = True
+        self.score = 0
+        self.ticks = 0
+        self.fruit = None
+        self.place_fruit()
+
+    def cell(self, x, y):  # Turns a board position into a cell index
+        return y * self.cell_number + x
+
+    def position(self, cell):  # Turns a cell index back into an (x, y) board position
+        y, x = divmod(cell, self.cell_number)
+        return x, y
+
+    @property
+    def head(self):
+        return self.ring[self.head_index]
+
+    @property
+    def tail(self):
+        return self.ring[(self.head_index + self.length - 1) % self.capacity]
+
+    def segment(self, index):  # The cell of the body segment at the given index, counting negative ones from the tail
+        if index < 0:
+            index += self.length
+        return self.ring[(self.head_index + index) % self.capacity]
+
+    def link(self, index):  # The link codes of the segment at the given index, counting negative ones from the tail
+        if index < 0:
+            index += self.length
+        return self.links[(self.head_index + index) % self.capacity]
+
+    def index_of(self, cell):  # The body index of the segment in an occupied cell, so drawing can start from a cell
+        return (self.slot[cell] - self.head_index) % self.capacity
+
+    def cells(self):  # Walks the body from head to tail
+        ring, capacity, index = self.ring, self.capacity, self.head_index
+        for offset in range(self.length):
+            yield ring[(index + offset) % capacity]
+
+    @property
+    def body(self):  # The body as (x, y) positions, head first
+        return [self.position(cell) for cell in self.cells()]
+
+    def turn(self, direction):  # Changes direction unless it would reverse the snake into itself
+        if direction == OPPOSITE[self.direction]:
+            return False
+        self.direction = direction
+        return True
+
+    def step(self, action=None):  # Advances the game by one tick and returns what happened
+        if not self.alive:
+            return []
+        if action is not None:
+            self.turn(action)
+
+        events = []
+        self.ticks += 1
+        head = self.move_snake()
+
+        if head == self.fruit:
+            self.new_block = True
+            self.score += 1
+            self.place_fruit()
+            events.append(ATE)
+
+        if self.occupied[head] > 1:
+            self.alive = False
+            events.append(DIED)
+        return events
+
+    def push_head(self, cell, ahead=None):  # ahead is the move's link code, worked out if not given
+        old = self.head_index
+        self.head_index = index = (old - 1) % self.capacity
+        if self.length:  # The old head gets the new one ahead of it, which has the old head behind it
+            if ahead is None:
+                ahead = link_code(self.cell_number, self.ring[old], cell)
+            self.links[old] = self.links[old] & 3 | ahead << 2
+            self.links[index] = ahead ^ 1
+        self.ring[index] = cell
+        self.slot[cell] = index
+        self.length += 1
+        if not self.occupied[cell]:
+            self.claim(cell)
+        self.occupied[cell] += 1
+
+    def pop_tail(self):
+        self.length -= 1
+        cell = self.ring[(self.head_index + self.length) % self.capacity]
+        self.occupied[cell] -= 1
+        if not self.occupied[cell]:
+            self.release(cell)
+        return cell
+
+    def claim(self, cell):  # Takes a cell out of the free array by swapping the last free cell into its slot
+        free, free_index = self.free, self.free_index
+        index = free_index[cell]
+        last = free.pop()
+        if last != cell:
+            free[index] = last
+            free_index[last] = index
+        free_index[cell] = -1
+
+    def release(self, cell):  # Puts a cell back on the end of the free array
+        self.free_index[cell] = len(self.free)
+        self.free.append(cell)
+
+    def move_snake(self):  # Moves the head one cell forward, wrapping through the walls, and drops the tail
+        n = self.cell_number
+        y, x = divmod(self.ring[self.head_index], n)
+        dx, dy = self.direction
+        head = (y + dy) % n * n + (x + dx) % n
+        if self.new_block:
+            self.new_block = False
+            self.vacated = None
+        else:
+            self.vacated = self.pop_tail()
+        self.push_head(head, LINK_CODES[self.direction])
+        return head
+
+    def place_fruit(self):  # Moves the fruit to a uniformly random empty cell, or removes it on a full board
+        if self.free:
+            self.fruit = self.free[self.rng.randrange(len(self.free))]
+        else:
+            self.fruit = None
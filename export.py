@@ -0,0 +1,254 @@
+import argparse
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")  # Its greeting would end up in a video on stdout
+
+import pygame
+
+from engine import ATE
+from main import BOARD_SIZE, Game
+from replay import Replay
+from scenes import GameOverScene
+from startup import resident_memory
+
+FPS = 60
+HOLD = 2.0  # Seconds the game over screen stays up at the end of a finished game
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_LEVEL = 1  # Frames are on their way to a video encoder, so fast beats small; 6 takes twice as long for 40% less
+RGB_MASKS = (0xFF, 0xFF00, 0xFF0000, 0)  # A 24 bit surface with these masks holds its pixels in R, G, B order
+
+
+def png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(data, zlib.crc32(kind)))
+
+
+def encode_png(pixels, width, height, pitch, level=PNG_LEVEL):  # RGB rows pitch bytes apart as a PNG file, with
+    # zlib doing the work and letting go of the GIL while it does, so threads encode in parallel
+    stride = width * 3
+    rows = b"".join(b"\x00" + pixels[start:start + stride] for start in range(0, pitch * height, pitch))
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)  # 8 bit RGB, no interlacing
+    return (PNG_SIGNATURE + png_chunk(b"IHDR", header) + png_chunk(b"IDAT", zlib.compress(rows, level))
+            + png_chunk(b"IEND", b""))
+
+
+def save_png(path, pixels, width, height, pitch, level):
+    data = encode_png(pixels, width, height, pitch, level)
+    with open(path, "wb") as file:
+        file.write(data)
+    return len(data)
+
+
+class PngFrames:  # Numbered PNG files, encoded on a thread pool that only lets so many frames wait at once
+    def __init__(self, directory, workers=None, pending=None, level=PNG_LEVEL):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.frame = None
+        self.level = level
+        workers = workers or os.cpu_count() or 1
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="png")
+        # Each waiting frame holds its pixels, so the cap on them is the cap on the memory they take
+        self.slots = threading.BoundedSemaphore(pending or 2 * workers)
+        self.error = None
+        self.written = 0
+
+    def start(self, window):
+        # Frames are copied off the window through a surface already in PNG's byte order, which SDL converts to far
+        # quicker than image.tostring can
+        self.frame = pygame.Surface(window.get_size(), 0, 24, RGB_MASKS)
+
+    def write(self, index, window):
+        if self.error is not None:
+            raise self.error
+        self.frame.blit(window, (0, 0))
+        pixels = self.frame.get_buffer().raw
+        self.slots.acquire()
+        path = os.path.join(self.directory, f"frame_{index:06d}.png")
+        future = self.pool.submit(save_png, path, pixels, *self.frame.get_size(), self.frame.get_pitch(), self.level)
+        future.add_done_callback(self.finished)
+
+    def finished(self, future):
+        self.slots.release()
+        if future.exception() is not None:
+            self.error = future.exception()
+        else:
+            self.written += future.result()
+
+    def close(self):
+        self.pool.shutdown()
+        if self.error is not None:
+            raise self.error
+
+
+class RawFrames:  # The window's pixels as they are, one frame after another, for piping straight into an encoder
+    def __init__(self, path):
+        self.to_stdout = path == "-"
+        self.stream = sys.stdout.buffer if self.to_stdout else open(path, "wb")
+        self.written = 0
+        self.pixel_format = None
+
+    def start(self, window):  # Names the window's byte order the way ffmpeg does, e.g. bgr0 for 32 bit XRGB
+        names = {window.get_shifts()[channel]: name for channel, name in enumerate("rgb")}
+        self.pixel_format = "".join(names.get(shift, "0") for shift in (0, 8, 16, 24)[:window.get_bytesize()])
+
+    def write(self, index, window):
+        pixels = window.get_buffer().raw
+        self.stream.write(pixels)
+        self.written += len(pixels)
+
+    def close(self):
+        self.stream.flush()
+        if not self.to_stdout:
+            self.stream.close()
+
+
+class Playback:  # Steps a replay's game up to any point in time, keeping the game's drawing state up with it
+    def __init__(self, replay, game, fps):
+        self.game = game
+        self.fps = fps
+        self.records = replay.records()
+        self.next = next(self.records, None)
+        # Times are in thousandths of a frame, so frame n is at n * 1000. Each speed change starts a new stretch of
+        # ticks all the same length, which begins at this tick and time
+        self.start_tick = 0
+        self.start_time = 0
+
+    def tick_length(self):  # In thousandths of a frame
+        return self.fps * self.game.game_speed
+
+    def position(self, time):  # The tick showing at a time and how far through it, 0 to 1
+        tick, into = divmod(time - self.start_time, self.tick_length())
+        return self.start_tick + tick, into / self.tick_length()
+
+    def apply_records(self):  # Makes the turns and speed changes recorded before the next tick's step
+        engine = self.game.engine
+        while self.next is not None and self.next[0] <= engine.ticks:
+            tick, direction, speed = self.next
+            if direction is not None:
+                engine.turn(direction)
+            if speed is not None:
+                self.start_time += (engine.ticks - self.start_tick) * self.tick_length()
+                self.start_tick = engine.ticks
+                self.game.set_game_speed(speed)
+            self.next = next(self.records, None)
+
+    def advance(self, time):  # Returns False if the recording stops short of the time
+        game = self.game
+        engine = game.engine
+        while True:
+            self.apply_records()
+            if engine.ticks >= self.position(time)[0]:
+                return True
+            if self.next is None or not engine.alive:
+                return False
+            events = engine.step()
+            if game.camera.follow():
+                game.dirty.invalidate()
+            if ATE in events:
+                game.score = engine.score
+            # Several ticks can pass between frames, so each one's changes are noted before the next overwrites them
+            game.dirty.collect()
+
+
+def load_scores(game):  # Fills in the game over panel from the leaderboard, as the live game's SCORES_READY would.
+    # Nothing here reads events, so it's asked directly. The rank is where the score would place if played now, which
+    # is one lower among equal scores if this very game was saved when it was played
+    try:
+        leaderboard = game.leaderboard.result()
+        game.high_score = leaderboard.best(game.game_speed)
+        game.rank = leaderboard.rank(game.game_speed, game.score)
+    except OSError as error:
+        print(f"Couldn't read the leaderboard, the high score shown is the replay's own: {error}", file=sys.stderr)
+
+
+def export(path, sink, size=None, fps=FPS, hold=HOLD):  # Renders a replay frame by frame, returns the frame count
+    replay = Replay.open(path)
+    game = Game(replay.seed, replay.cell_number, size)
+    game.set_game_speed(replay.game_speed)
+    game.running = game.game_active = True
+    game.resume_play()
+    playback = Playback(replay, game, fps)
+    sink.start(game.WINDOW)
+
+    # Frame n lands n / fps seconds in, so it is drawn that far through its tick, as the live game draws it
+    frame = 0
+    try:
+        while True:
+            if not playback.advance(frame * 1000) or not game.engine.alive:
+                break
+            game.snake.alpha = playback.position(frame * 1000)[1] if game.interpolate else 1.0
+            game.draw_changes()
+            sink.write(frame, game.WINDOW)
+            frame += 1
+
+        if not game.engine.alive:
+            game.game_active = False
+            load_scores(game)
+            GameOverScene(game).draw()
+            for _ in range(round(hold * fps)):
+                sink.write(frame, game.WINDOW)
+                frame += 1
+    finally:
+        replay.close()
+    if replay.final is not None and replay.final != (game.engine.ticks, game.engine.score, game.engine.length):
+        print(f"{path}: replay expected ticks/score/length {replay.final}, got "
+              f"{(game.engine.ticks, game.engine.score, game.engine.length)}", file=sys.stderr)
+    return frame, game.SCREEN_DIMENSIONS
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Renders a replay offline, as fast as it will go, to numbered PNG "
+                                                 "files or a stream of raw frames. Raw frames come out far faster "
+                                                 "than real time at any size. PNG encoding is the limit: one core "
+                                                 "keeps up with 60fps only to about 1000x1000, so larger frames "
+                                                 "need more --workers and cores, or --raw")
+    parser.add_argument("replay")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("--frames", metavar="DIR", help="Write frame_000000.png and on into this directory, at "
+                                                          "about 70 frames/sec per core at 1000x1000")
+    output.add_argument("--raw", metavar="PATH", help="Write raw frames to this file, - for stdout")
+    parser.add_argument("--size", type=int, nargs=2, metavar=("WIDTH", "HEIGHT"), default=(BOARD_SIZE, BOARD_SIZE),
+                        help="Rounded to whole cells")
+    parser.add_argument("--fps", type=int, default=FPS)
+    parser.add_argument("--hold", type=float, default=HOLD, help="Seconds of game over screen at the end")
+    parser.add_argument("--workers", type=int, default=None, help="PNG encoding threads, one per CPU by default")
+    parser.add_argument("--pending", type=int, default=None, help="Frames allowed to wait for encoding, "
+                                                                   "twice the workers by default")
+    parser.add_argument("--level", type=int, default=PNG_LEVEL, help="PNG compression level, 0 to 9")
+    args = parser.parse_args()
+
+    if args.frames:
+        sink = PngFrames(args.frames, args.workers, args.pending, args.level)
+    else:
+        sink = RawFrames(args.raw)
+    start = time.perf_counter()
+    try:
+        frames, size = export(args.replay, sink, tuple(args.size), args.fps, args.hold)
+    finally:
+        sink.close()
+        pygame.quit()
+    elapsed = time.perf_counter() - start
+
+    report = sys.stderr if args.raw == "-" else sys.stdout  # Stdout may be the video
+    peak = resident_memory(peak=True)
+    print(f"{frames} frames of {size[0]}x{size[1]} in {elapsed:.2f}s: {frames / elapsed:.1f} frames/sec, "
+          f"{frames / args.fps / elapsed:.1f}x real time, {sink.written / 2 ** 20:.1f} MB written", file=report)
+    if peak is not None:
+        print(f"peak memory {peak / 2 ** 20:.1f} MB", file=report)
+    if frames / elapsed < args.fps:
+        print("slower than real time, PNG encoding wants more --workers and cores at this size, or use --raw",
+              file=report)
+    if args.raw:
+        print(f"ffmpeg -f rawvideo -pix_fmt {sink.pixel_format} -s {size[0]}x{size[1]} -r {args.fps} "
+              f"-i {args.raw} clip.mp4", file=report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,352 @@
+import argparse
+import os
+import random
+import struct
+import sys
+import threading
+import time
+import zlib
+from array import array
+from bisect import bisect_right, insort
+
+SCORE_DIR = "scores"
+SPEEDS = (150, 100, 50, 10)  # The difficulties, as milliseconds per tick
+
+# The log is a header and then fixed size records, each checked by a CRC, so a record torn by a crash or power cut is
+# spotted and dropped. It is only ever appended to, everything else can be rebuilt from it
+LOG_MAGIC = b"SNKSCOR1"
+RECORD = struct.Struct("<HIId")  # Speed, score, seed, when it was played
+CRC = struct.Struct("<I")
+RECORD_SIZE = RECORD.size + CRC.size
+
+# The index is a sorted key array per speed, saved so opening doesn't mean reading the whole log. Each key is the score
+# above the record number counted down from the top, so higher scores sort last and an earlier run beats a later tie
+INDEX_MAGIC = b"SNKRANK1"
+INDEX_HEADER = struct.Struct("<8sQI")  # Magic, records covered, speeds that follow
+INDEX_SPEED = struct.Struct("<IQ")  # Speed, keys that follow
+LOW_BITS = 0xFFFFFFFF
+COMPACT_AT = 4096  # Scores held outside the main arrays before they're merged in and the index saved
+BULK_CHUNK = 1 << 16  # Records written per write and sync by a bulk import
+
+
+def make_key(score, record):
+    return score << 32 | LOW_BITS - record
+
+
+def key_record(key):
+    return LOW_BITS - (key & LOW_BITS)
+
+
+class Leaderboard:  # Every score ever played, with ranks and top lists per speed answered by binary search
+    # Reads are safe from any thread, scores should be added from one thread at a time
+    def __init__(self, directory=SCORE_DIR):
+        self.directory = directory
+        self.log_path = os.path.join(directory, "scores.log")
+        self.index_path = os.path.join(directory, "scores.idx")
+        self.lock = threading.Lock()  # Held only to read or swap the arrays, never across disk writes
+        self.reader_lock = threading.Lock()
+        self.main = {}  # Speed -> sorted array of keys, as last saved in the index
+        self.recent = {}  # Speed -> sorted list of keys added since
+        self.records = 0
+        self.log = None  # Opened for appending on the first add, so only reading never creates files
+        self.reader = None
+        self.load()
+
+    def load(self):  # Reads the index and catches up on whatever the log gained after it was saved
+        self.records = self.check_log()
+        covered = self.load_index()
+        if covered is None or covered > self.records:
+            self.main = {}
+            covered = 0
+        self.recent = {}
+        pending = {}
+        for record, (speed, score, _, _) in self.read_records(covered):
+            pending.setdefault(speed, []).append(make_key(score, record))
+        if covered == 0:  # No usable index, so the whole log gets sorted into fresh arrays
+            self.main = {speed: array("Q", sorted(keys)) for speed, keys in pending.items()}
+            if self.records:
+                self.save_index()
+        else:
+            self.recent = {speed: sorted(keys) for speed, keys in pending.items()}
+
+    def check_log(self):  # The number of whole records in the log, cutting off any torn one left by a crash
+        try:
+            size = os.path.getsize(self.log_path)
+        except OSError:
+            return 0
+        records, torn = divmod(max(0, size - len(LOG_MAGIC)), RECORD_SIZE)
+        if torn:
+            with open(self.log_path, "r+b") as log:
+                log.truncate(len(LOG_MAGIC) + records * RECORD_SIZE)
+        return records
+
+    def read_records(self, start=0):  # Yields (record number, fields) from start on, skipping any that fail the CRC
+        if not self.records or start >= self.records:
+            return
+        with open(self.log_path, "rb") as log:
+            if log.read(len(LOG_MAGIC)) != LOG_MAGIC:
+                raise ValueError(f"{self.log_path} is not a score log")
+            log.seek(len(LOG_MAGIC) + start * RECORD_SIZE)
+            record = start
+            while record < self.records:
+                chunk = log.read(min(self.records - record, 65536) * RECORD_SIZE)
+                if not chunk:
+                    break
+                for offset in range(0, len(chunk), RECORD_SIZE):
+                    body = chunk[offset:offset + RECORD.size]
+                    if CRC.unpack_from(chunk, offset + RECORD.size)[0] == zlib.crc32(body):
+                        yield record, RECORD.unpack(body)
+                    record += 1
+
+    def load_index(self):  # Returns how many log records the saved index covers, or None if there isn't a good one
+        try:
+            with open(self.index_path, "rb") as index:
+                magic, covered, speeds = INDEX_HEADER.unpack(index.read(INDEX_HEADER.size))
+                if magic != INDEX_MAGIC:
+                    return None
+                main = {}
+                for _ in range(speeds):
+                    speed, count = INDEX_SPEED.unpack(index.read(INDEX_SPEED.size))
+                    keys = array("Q")
+                    keys.fromfile(index, count)
+                    if sys.byteorder == "big":
+                        keys.byteswap()
+                    main[speed] = keys
+        except (OSError, EOFError, struct.error):
+            return None
+        self.main = main
+        return covered
+
+    def save_index(self):  # Writes the main arrays beside the log, swapped in whole so a crash leaves the old one
+        os.makedirs(self.directory, exist_ok=True)
+        temporary = self.index_path + ".tmp"
+        with open(temporary, "wb") as index:
+            index.write(INDEX_HEADER.pack(INDEX_MAGIC, self.records, len(self.main)))
+            for speed, keys in self.main.items():
+                index.write(INDEX_SPEED.pack(speed, len(keys)))
+                if sys.byteorder == "big":
+                    keys = array("Q", keys)
+                    keys.byteswap()
+                keys.tofile(index)
+            index.flush()
+            os.fsync(index.fileno())
+        os.replace(temporary, self.index_path)
+
+    def open_log(self):
+        if self.log is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self.log = open(self.log_path, "ab")
+            if self.log.tell() == 0:
+                self.log.write(LOG_MAGIC)
+
+    def append(self, entries):  # Writes records to the log and makes them durable, returns the first record number
+        self.open_log()
+        data = bytearray()
+        for speed, score, seed, played in entries:
+            body = RECORD.pack(speed, score, seed, played)
+            data += body
+            data += CRC.pack(zlib.crc32(body))
+        self.log.write(data)
+        self.log.flush()
+        os.fsync(self.log.fileno())
+        first = self.records
+        self.records += len(data) // RECORD_SIZE
+        return first
+
+    def add(self, speed, score, seed=0, played=None):  # Saves one score and returns its rank, slow enough for a thread
+        record = self.append([(speed, score, seed, time.time() if played is None else played)])
+        key = make_key(score, record)
+        with self.lock:
+            recent = self.recent.setdefault(speed, [])
+            insort(recent, key)
+            rank = self.rank_of(speed, key)
+        if len(recent) >= COMPACT_AT:
+            self.compact()
+        return rank
+
+    def add_many(self, entries, chunk=BULK_CHUNK):  # Bulk import, sorted into the main arrays once at the end
+        added = {}
+        batch = []
+        for entry in entries:
+            batch.append(entry)
+            if len(batch) == chunk:
+                self.add_keys(added, batch)
+                batch = []
+        if batch:
+            self.add_keys(added, batch)
+        merged = {}
+        for speed, keys in added.items():
+            with self.lock:
+                keys.extend(self.main.get(speed, ()))
+                keys.extend(self.recent.get(speed, ()))
+            merged[speed] = array("Q", sorted(keys))
+        with self.lock:
+            for speed, keys in merged.items():
+                self.main[speed] = keys
+                self.recent[speed] = []
+        self.save_index()
+
+    def add_keys(self, added, batch):  # Logs a batch and collects its keys by speed
+        first = self.append(batch)
+        for record, (speed, score, _, _) in enumerate(batch, first):
+            added.setdefault(speed, array("Q")).append(make_key(score, record))
+
+    def compact(self):  # Merges the recent scores into the main arrays and saves the index
+        with self.lock:
+            recent = {speed: list(keys) for speed, keys in self.recent.items() if keys}
+        merged = {}
+        for speed, keys in recent.items():
+            # Splice the few new keys into the big array a slice at a time, so the copying all happens in C
+            main = self.main.get(speed, array("Q"))
+            result = array("Q")
+            start = 0
+            for key in keys:
+                end = bisect_right(main, key, start)
+                result += main[start:end]
+                result.append(key)
+                start = end
+            result += main[start:]
+            merged[speed] = result
+        with self.lock:  # Scores are only added from one thread at a time, so nothing joined recent meanwhile
+            for speed, keys in merged.items():
+                self.main[speed] = keys
+                self.recent[speed] = []
+        self.save_index()
+
+    def rank_of(self, speed, key):  # 1 plus the number of keys above this one
+        above = 0
+        main = self.main.get(speed)
+        if main is not None:
+            above += len(main) - bisect_right(main, key)
+        recent = self.recent.get(speed)
+        if recent:
+            above += len(recent) - bisect_right(recent, key)
+        return above + 1
+
+    def rank(self, speed, score):  # The rank a score would get if played now, behind any equal scores already in
+        with self.lock:
+            return self.rank_of(speed, make_key(score, LOW_BITS))
+
+    def count(self, speed):
+        with self.lock:
+            return len(self.main.get(speed, ())) + len(self.recent.get(speed, ()))
+
+    def best(self, speed):  # The top score at a speed, or 0 before any
+        with self.lock:
+            tops = [keys[-1] for keys in (self.main.get(speed), self.recent.get(speed)) if keys]
+        return max(tops) >> 32 if tops else 0
+
+    def top(self, speed, count=10):  # The best runs at a speed, as (score, seed, played), best first
+        with self.lock:
+            keys = list(self.main.get(speed, array("Q"))[-count:]) + list(self.recent.get(speed, ())[-count:])
+        keys = sorted(keys, reverse=True)[:count]
+        return [self.entry(key_record(key))[1:] for key in keys]
+
+    def entry(self, record):  # Reads one record back from the log
+        with self.reader_lock:
+            if self.reader is None:
+                self.reader = open(self.log_path, "rb")
+            self.reader.seek(len(LOG_MAGIC) + record * RECORD_SIZE)
+            return RECORD.unpack(self.reader.read(RECORD.size))
+
+    def close(self):
+        for log in (self.log, self.reader):
+            if log is not None:
+                log.close()
+        self.log = self.reader = None
+
+
+def replay_scores(directory):  # (speed at the end, score, seed, played) for every finished replay in a directory
+    from replay import EXTENSION, Replay
+
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(EXTENSION):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            replay = Replay.open(path)
+            try:
+                for _ in replay.records():
+                    pass
+            finally:
+                replay.close()
+        except (OSError, ValueError):  # Unreadable or damaged part way through, either way it has no score
+            continue
+        if replay.final is not None:
+            yield replay.final_speed, replay.final[1], replay.seed, os.path.getmtime(path)
+
+
+def random_scores(count, rng):  # Made up runs for the benchmark, most short and a few long like real play
+    now = time.time()
+    for _ in range(count):
+        yield rng.choice(SPEEDS), int(rng.expovariate(1 / 15)), rng.randrange(2 ** 32), now - rng.random() * 3e7
+
+
+def timed(label, count, function, *args):  # Runs function, printing its rate, and returns what it returned
+    start = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - start
+    rate = f"  {count / elapsed:>12,.0f}/s" if count > 1 else ""
+    print(f"{label:<32} {count:>10} in {elapsed:8.3f}s{rate}", flush=True)
+    return result
+
+
+def bench(directory, entries, queries, adds, rebuild, seed):
+    rng = random.Random(seed)
+    board = Leaderboard(directory)
+    timed("bulk import", entries, board.add_many, random_scores(entries, rng))
+    board.close()
+    board = timed("open from the index", 1, Leaderboard, directory)
+    print(f"{'log size':<32} {os.path.getsize(board.log_path) / 2 ** 20:>10.1f} MB, "
+          f"index {os.path.getsize(board.index_path) / 2 ** 20:.1f} MB")
+
+    probes = [(rng.choice(SPEEDS), int(rng.expovariate(1 / 15))) for _ in range(queries)]
+    timed("rank queries", queries, lambda: [board.rank(speed, score) for speed, score in probes])
+    timed("top 10 queries", queries // 10, lambda: [board.top(speed) for speed, _ in probes[:queries // 10]])
+    timed("durable adds, synced each", adds, lambda: [board.add(*entry) for entry in random_scores(adds, rng)])
+    timed(f"compact {adds} recent scores", adds, board.compact)
+    board.close()
+
+    if rebuild:
+        os.remove(board.index_path)
+        board = timed("open rebuilding the index", entries + adds, Leaderboard, directory)
+
+    for speed in SPEEDS:
+        best = board.top(speed, 1)
+        print(f"speed {speed:>3}: {board.count(speed):>10} scores, best {best[0][0] if best else 0}, "
+              f"a score of 30 ranks #{board.rank(speed, 30)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shows, imports into or benchmarks the score log")
+    parser.add_argument("--dir", default=SCORE_DIR)
+    parser.add_argument("--top", type=int, metavar="SPEED", help="Print the best scores at this speed")
+    parser.add_argument("--count", type=int, default=10)
+    parser.add_argument("--import-replays", metavar="DIR", help="Add the score of every finished replay in DIR")
+    parser.add_argument("--bench", type=int, metavar="ENTRIES", help="Bulk load this many made up scores into a "
+                        "fresh directory and time inserts and queries")
+    parser.add_argument("--queries", type=int, default=100000)
+    parser.add_argument("--adds", type=int, default=1000, help="Single synced adds timed by --bench")
+    parser.add_argument("--rebuild", action="store_true", help="Also time rebuilding the index from the log")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.bench:
+        if os.path.exists(os.path.join(args.dir, "scores.log")):
+            parser.error(f"{args.dir} already holds scores, point --dir at a fresh directory to benchmark")
+        bench(args.dir, args.bench, args.queries, args.adds, args.rebuild, args.seed)
+        return
+
+    board = Leaderboard(args.dir)
+    if args.import_replays:
+        before = board.records
+        board.add_many(replay_scores(args.import_replays))
+        print(f"Imported {board.records - before} scores")
+    if args.top is not None:
+        for rank, (score, seed, played) in enumerate(board.top(args.top, args.count), 1):
+            print(f"{rank:>4}. {score:>6}  seed {seed:<10} {time.strftime('%Y-%m-%d %H:%M', time.localtime(played))}")
+    board.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+import argparse
+import asyncio
+import random
+import time
+
+from protocol import PORT, LENGTH, WELCOME, KEYFRAME, DELTA, JOIN, TURN, ArenaMirror, get_varint, message, \
+    read_message
+from scheduler import percentile
+
+try:
+    import resource
+except ImportError:  # Windows, where the socket limit isn't a per process file limit
+    resource = None
+
+LATE = 1.5  # A tick arriving this many tick lengths after the one before counts as late
+
+
+class Bot:  # One headless player: reads everything the server sends and turns at random now and then
+    def __init__(self, rng, turn_chance, mirrored):
+        self.rng = rng
+        self.turn_chance = turn_chance
+        self.mirror = ArenaMirror() if mirrored else None  # A few bots decode everything, to check the deltas
+        self.received = 0
+        self.ticks = 0
+        self.late = 0
+        self.tick_ms = None
+        self.server = None  # The server's (ticks, overruns) from the latest keyframe
+        self.started = self.finished = None
+
+    async def run(self, host, port, room):
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(message(JOIN, room))
+        clock = time.perf_counter
+        self.started = last = clock()
+        try:
+            while True:
+                payload = await read_message(reader)
+                now = clock()
+                self.received += LENGTH.size + len(payload)
+                kind = payload[0]
+                if self.mirror is not None:
+                    self.mirror.apply(payload)
+                if kind == DELTA:
+                    self.ticks += 1
+                    if self.tick_ms and now - last > LATE * self.tick_ms / 1000:
+                        self.late += 1
+                    last = now
+                elif kind == KEYFRAME:
+                    offset = get_varint(payload, 1)[1]
+                    server_ticks, offset = get_varint(payload, offset)
+                    self.server = server_ticks, get_varint(payload, offset)[0]
+                elif kind == WELCOME:
+                    offset = get_varint(payload, 1)[1]  # Past the snake id
+                    offset = get_varint(payload, offset)[1]  # and the board size
+                    self.tick_ms = get_varint(payload, offset)[0]
+                if self.rng.random() < self.turn_chance:
+                    writer.write(message(TURN, self.rng.randrange(4)))
+        finally:
+            self.finished = clock()
+            writer.close()
+
+    @property
+    def rate(self):  # Bytes per second received
+        return self.received / max(1e-9, self.finished - self.started)
+
+
+async def load(host, port, bots, room, duration, ramp, turn_chance, mirrored, seed):
+    rng = random.Random(seed)
+    crew = [Bot(random.Random(rng.randrange(2 ** 32)), turn_chance, index < mirrored) for index in range(bots)]
+    tasks = []
+    for index, bot in enumerate(crew):  # Connect gradually so the accept queue isn't flooded
+        tasks.append(asyncio.ensure_future(bot.run(host, port, room)))
+        if index % 50 == 49:
+            await asyncio.sleep(ramp * 50 / bots)
+    await asyncio.sleep(1.0)
+    first = {id(bot): bot.server for bot in crew}
+    await asyncio.sleep(duration)
+    for task in tasks:
+        task.cancel()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    failures = [result for result in results if result is not None and not isinstance(result, asyncio.CancelledError)]
+    return crew, first, failures
+
+
+def raise_file_limit():  # Every bot is a socket, which can run past the default limit of open files
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plays bots against a server and reports how well it kept up")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--bots", type=int, default=1000)
+    parser.add_argument("--room", type=int, default=0, help="Room to put every bot in, 0 fills rooms in turn")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to measure for, once connected")
+    parser.add_argument("--ramp", type=float, default=5.0, help="Seconds taken to connect every bot")
+    parser.add_argument("--turn-chance", type=float, default=0.05, help="Chance of turning per message received")
+    parser.add_argument("--mirrored", type=int, default=4, help="Bots that decode the room and check it "
+                                                                "against each keyframe")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    raise_file_limit()
+    crew, first, failures = asyncio.run(load(args.host, args.port, args.bots, args.room, args.duration, args.ramp,
+                                             args.turn_chance, args.mirrored, args.seed))
+    connected = [bot for bot in crew if bot.finished is not None and bot.ticks]
+    print(f"{len(connected)} of {args.bots} bots received ticks, {len(failures)} failed"
+          + (f" ({failures[0]!r})" if failures else ""))
+    if not connected:
+        return
+
+    rates = [bot.rate for bot in connected]
+    print(f"bytes/sec per client: mean {sum(rates) / len(rates):.0f}, p50 {percentile(rates, 0.5):.0f}, "
+          f"p99 {percentile(rates, 0.99):.0f}")
+    ticks = sum(bot.ticks for bot in connected)
+    late = sum(bot.late for bot in connected)
+    print(f"ticks received late: {late} of {ticks} ({late / ticks:.2%})")
+
+    # The server's own count, from the keyframes any bot saw at the start and the end of the measurement
+    samples = [(first[id(bot)], bot.server) for bot in connected if first[id(bot)] and bot.server]
+    if samples:
+        start_ticks, start_overruns = min(start for start, _ in samples)
+        end_ticks, end_overruns = max(end for _, end in samples)
+        if end_ticks > start_ticks:
+            overruns = end_overruns - start_overruns
+            print(f"server tick overruns: {overruns} of {end_ticks - start_ticks} "
+                  f"({overruns / (end_ticks - start_ticks):.2%})")
+    mirrors = [bot.mirror for bot in connected if bot.mirror is not None]
+    if mirrors:
+        print(f"decoded {sum(mirror.keyframes for mirror in mirrors)} keyframes on {len(mirrors)} bots, "
+              f"{sum(mirror.desyncs for mirror in mirrors)} disagreed with the deltas")
+
+
+if __name__ == '__main__':
+    main()
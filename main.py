@@ -1,11 +1,92 @@
+import time
+
+STARTED = time.perf_counter()  # Taken before the heavy imports so the startup report can include them
+
+import argparse
 import pygame
 import sys
 import math
-import random
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pygame.math import Vector2
 
+from atlas import AtlasPages, load_atlas
+from audio import Music, SfxMixer
+from autopilot import Autopilot
+from bundle import open_source
+from profiler import FrameProfiler
+from scenes import GameOverScene, NetworkScene, OptionsScene, PauseScene, StartScene
+from scheduler import FixedTimestep, TimingStats
+from startup import StartupTimer
+from text_cache import TextCache
+from protocol import PORT, Connection
+from replay import CODES, EXTENSION, ReplayWriter
+from leaderboard import Leaderboard
+from engine import CELL_NUMBER, NORTH, SOUTH, EAST, WEST, ATE, DIED, SnakeEngine, board_size, link_code
+
 CELL_SIZE = 40
-CELL_NUMBER = 25
+VIEW_CELLS = CELL_NUMBER  # Cells shown across the window, bigger boards scroll with the snake
+BOARD_SIZE = CELL_SIZE * CELL_NUMBER  # The menus are laid out on a board this many pixels across, then scaled to fit
+EXPOSE_EVENTS = (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED, pygame.WINDOWRESTORED)  # The window's pixels may be gone
+
+# Sprites drawn one cell in size
+BOARD_SPRITES = {
+    "head_up": "Graphics/head_up.png",
+    "head_down": "Graphics/head_down.png",
+    "head_right": "Graphics/head_right.png",
+    "head_left": "Graphics/head_left.png",
+    "tail_up": "Graphics/tail_up.png",
+    "tail_down": "Graphics/tail_down.png",
+    "tail_right": "Graphics/tail_right.png",
+    "tail_left": "Graphics/tail_left.png",
+    "body_vertical": "Graphics/body_vertical.png",
+    "body_horizontal": "Graphics/body_horizontal.png",
+    "body_tr": "Graphics/body_tr.png",
+    "body_tl": "Graphics/body_tl.png",
+    "body_br": "Graphics/body_br.png",
+    "body_bl": "Graphics/body_bl.png",
+    "pizza": "Graphics/pizza_bubble.png",
+}
+
+# Sprites with their size on the unscaled layout
+MENU_SPRITES = {
+    "background": ("Graphics/water_background.png", (BOARD_SIZE, BOARD_SIZE)),
+    "game_over": ("Graphics/game_over.png", (464, 465)),
+    "press_spacebar": ("Graphics/press_spacebar2.png", (480, 158)),
+    "resume": ("Graphics/resume_button.png", (413, 140)),
+    "start_spacebar": ("Graphics/start_spacebar.png", (674, 370)),
+    "button_options": ("Graphics/button_options.png", (201, 80)),
+    "options_screen": ("Graphics/difficulty.png", (374, 492)),
+}
+
+# Loaded before the first frame along with the board sprites, everything else loads in the background
+START_SPRITES = ("background", "start_spacebar")
+
+SOUNDS = {
+    "crunch": "Sound/crunch.wav",
+    "crash": "Sound/crash.wav",
+}
+
+# Sprites picked by a segment's link codes, whose directions run north, south, east, west (engine.LINK_DIRECTIONS).
+# The head and tail face away from their one neighbour, the body's table is indexed by the whole link
+HEAD_SPRITES = ("head_down", "head_up", "head_left", "head_right")
+TAIL_SPRITES = ("tail_down", "tail_up", "tail_left", "tail_right")
+CORNER_SPRITES = {(0, 3): "body_tl", (1, 3): "body_bl", (0, 2): "body_tr", (1, 2): "body_br"}
+
+
+def body_sprite(link):  # The body sprite joining the two directions in a link
+    ends = tuple(sorted((link & 3, link >> 2)))
+    if ends[1] <= 1:
+        return "body_vertical"
+    if ends[0] >= 2:
+        return "body_horizontal"
+    return CORNER_SPRITES[ends]
+
+
+BODY_SPRITES = tuple(body_sprite(link) for link in range(16))
+
+TURN_KEYS = {pygame.K_UP: NORTH, pygame.K_DOWN: SOUTH, pygame.K_LEFT: WEST, pygame.K_RIGHT: EAST}
 
 
 def screen_dimensions(width, height):  # Lets me easily change the dimensions of the game window
@@ -29,211 +110,271 @@ def update_score(score, hi_score):  # Replaces the high score if the current sco
 
 
 class Fruit:
-    def __init__(self, parent_screen, pizza):
-        self.pizza = pizza
+    def __init__(self, parent_screen, atlas, cell_size, engine, camera):
+        self.atlas = atlas
+        self.cell_size = cell_size
         self.parent_screen = parent_screen
-        self.x = random.randint(0, CELL_NUMBER - 1)
-        self.y = random.randint(0, CELL_NUMBER - 1)
-        self.pos = Vector2(self.x, self.y)
+        self.engine = engine
+        self.camera = camera
 
-    def draw_fruit(self, cell_size):  # Draws fruit onscreen
-        fruit_rect = pygame.Rect(self.pos.x * cell_size, self.pos.y * cell_size, cell_size, cell_size)
-        self.parent_screen.blit(self.pizza, fruit_rect)
+    @property
+    def pos(self):  # The fruit's position lives in the engine
+        return Vector2(self.engine.position(self.engine.fruit))
 
-    def randomise(self):  # Randomises the position of the fruit after being eaten
-        self.x = random.randint(0, CELL_NUMBER - 1)
-        self.y = random.randint(0, CELL_NUMBER - 1)
-        self.pos = Vector2(self.x, self.y)
+    def draw_fruit(self):  # Draws fruit onscreen
+        if self.engine.fruit is None or not self.camera.sees(self.engine.fruit):
+            return
+        cell_width, cell_height = self.cell_size
+        x, y = self.camera.offset(self.pos)
+        self.atlas.blit(self.parent_screen, "pizza", (x * cell_width, y * cell_height))
 
 
 class Snake:
-    def __init__(self, parent_screen):
+    def __init__(self, parent_screen, atlas, cell_size, engine, camera):
         self.parent_screen = parent_screen
-        self.start_position = [Vector2(5, 2), Vector2(4, 2), Vector2(3, 2)]
-        self.body = self.start_position
-        self.direction = Vector2(1, 0)
-        self.new_block = False
-
-        # Directions
-        self.north = False
-        self.south = False
-        self.east = True
-        self.west = False
-
-        # Body Assets
-        self.head_up = pygame.image.load('Graphics/head_up.png').convert_alpha()
-        self.head_down = pygame.image.load('Graphics/head_down.png').convert_alpha()
-        self.head_right = pygame.image.load('Graphics/head_right.png').convert_alpha()
-        self.head_left = pygame.image.load('Graphics/head_left.png').convert_alpha()
-
-        self.tail_up = pygame.image.load('Graphics/tail_up.png').convert_alpha()
-        self.tail_down = pygame.image.load('Graphics/tail_down.png').convert_alpha()
-        self.tail_right = pygame.image.load('Graphics/tail_right.png').convert_alpha()
-        self.tail_left = pygame.image.load('Graphics/tail_left.png').convert_alpha()
-
-        self.body_vertical = pygame.image.load('Graphics/body_vertical.png').convert_alpha()
-        self.body_horizontal = pygame.image.load('Graphics/body_horizontal.png').convert_alpha()
-
-        self.body_tr = pygame.image.load('Graphics/body_tr.png').convert_alpha()
-        self.body_tl = pygame.image.load('Graphics/body_tl.png').convert_alpha()
-        self.body_br = pygame.image.load('Graphics/body_br.png').convert_alpha()
-        self.body_bl = pygame.image.load('Graphics/body_bl.png').convert_alpha()
+        self.atlas = atlas
+        self.cell_size = cell_size
+        self.engine = engine
+        self.camera = camera
+        self.alpha = 1.0  # How far through the current tick we're drawing, the head and tail slide between cells
+        # Every sprite table resolved to its atlas surface and area once, so drawing a segment is two lookups
+        self.head_sprites = [atlas.source(name) for name in HEAD_SPRITES]
+        self.tail_sprites = [atlas.source(name) for name in TAIL_SPRITES]
+        self.body_sprites = [atlas.source(name) for name in BODY_SPRITES]
+
+    def block(self, index):  # The position of a single body segment, counting negative indexes from the tail
+        return Vector2(self.engine.position(self.engine.segment(index)))
 
     def draw_snake(self):  # Draws the snake on screen
-        for index, block in enumerate(self.body):  # Gives an index number to the block we are looking at
-            x_pos = block.x * CELL_SIZE
-            y_pos = block.y * CELL_SIZE
-            block_rect = pygame.Rect(x_pos, y_pos, CELL_SIZE, CELL_SIZE)
-
-            if index == 0:  # Refers to the first block ie the head
-                self.update_head_graphics(block_rect)
-
-            elif index == len(self.body) - 1:  # Refers to the last block ie the tail
-                self.update_tail_graphics(block_rect)
-
-            else:
-                previous_block = self.body[index + 1] - block
-                next_block = self.body[index - 1] - block
-                if previous_block.x == next_block.x:  # Draws vertical body
-                    self.parent_screen.blit(self.body_vertical, block_rect)
-                if previous_block.y == next_block.y:  # Draws horizontal body
-                    self.parent_screen.blit(self.body_horizontal, block_rect)
-                else:
-                    self.update_corner_graphics(previous_block, next_block, block_rect)
-                
-    def update_head_graphics(self, rect):  # Updates the head graphic depending on the direction you're facing
-        head_relation = self.body[1] - self.body[0]
-        if head_relation == Vector2(0, -1):
-            self.parent_screen.blit(self.head_down, rect)
-        if head_relation == Vector2(0, 1):
-            self.parent_screen.blit(self.head_up, rect)
-        if head_relation == Vector2(1, 0):
-            self.parent_screen.blit(self.head_left, rect)
-        if head_relation == Vector2(-1, 0):
-            self.parent_screen.blit(self.head_right, rect)
-
-    def update_corner_graphics(self, previous_block, next_block, rect):  # Updates the corner graphics when turning
-        if previous_block.x == -1 and next_block.y == -1 or previous_block.y == -1 and next_block.x == -1:
-            self.parent_screen.blit(self.body_tl, rect)
-        if previous_block.x == -1 and next_block.y == 1 or previous_block.y == 1 and next_block.x == -1:
-            self.parent_screen.blit(self.body_bl, rect)
-        if previous_block.x == 1 and next_block.y == -1 or previous_block.y == -1 and next_block.x == 1:
-            self.parent_screen.blit(self.body_tr, rect)
-        if previous_block.x == 1 and next_block.y == 1 or previous_block.y == 1 and next_block.x == 1:
-            self.parent_screen.blit(self.body_br, rect)
-
-    def update_tail_graphics(self, rect):  # Updates the tail graphic depending on the direction you're facing
-        tail_relation = self.body[-2] - self.body[-1]
-        if tail_relation == Vector2(0, -1):
-            self.parent_screen.blit(self.tail_down, rect)
-        if tail_relation == Vector2(0, 1):
-            self.parent_screen.blit(self.tail_up, rect)
-        if tail_relation == Vector2(1, 0):
-            self.parent_screen.blit(self.tail_left, rect)
-        if tail_relation == Vector2(-1, 0):
-            self.parent_screen.blit(self.tail_right, rect)
-
-    def move_snake(self):  # Moves the snake according to user input
-        if self.new_block:
-            body_copy = self.body[:]
-            body_copy.insert(0, body_copy[0] + self.direction)
-            self.body = body_copy[:]
-            self.new_block = False
+        # Tail first, so the head is drawn over the neck while it slides into its new cell
+        self.draw_blocks(sorted(self.visible_blocks(), reverse=True))
+
+    def visible_blocks(self):  # The indexes of the segments the camera can see
+        engine, camera = self.engine, self.camera
+        if engine.length <= camera.area:
+            return [index for index in range(engine.length) if camera.sees(engine.segment(index))]
+        # A snake longer than the view is looked up from the cells on screen instead, so it costs the same however long
+        occupied = engine.occupied
+        return [engine.index_of(cell) for cell in camera.cells() if occupied[cell]]
+
+    def draw_blocks(self, indexes):  # Draws the segments at the given indexes, in that order, with one blits() call
+        engine, body_sprites = self.engine, self.body_sprites
+        offset, position = self.camera.offset, engine.position
+        cell_width, cell_height = self.cell_size
+        last = engine.length - 1
+        blits = []
+        for index in indexes:
+            if index == 0 or index == last:
+                self.end_blits(index, blits)
+                continue
+            x, y = offset(position(engine.segment(index)))
+            surface, area = body_sprites[engine.link(index)]
+            blits.append((surface, (x * cell_width, y * cell_height), area))
+        self.parent_screen.blits(blits, doreturn=False)
+
+    def end_blits(self, index, blits):  # Adds the head or the tail, the two ends that slide while a tick plays out
+        engine = self.engine
+        block = self.block(index)
+        link = engine.link(index)
+        if index == 0:
+            surface, area = self.head_sprites[link & 3]
+            blits.append((surface, self.sliding(self.block(1), block), area))
+            return
+
+        if self.alpha < 1 and engine.vacated is not None:
+            # Until the tail has slid in, its cell still looks like the body segment it was a tick ago
+            behind = link_code(engine.cell_number, engine.segment(index), engine.vacated)
+            surface, area = self.body_sprites[behind | link & 12]
+            blits.append((surface, self.cell_position(block), area))
+            position = self.sliding(Vector2(engine.position(engine.vacated)), block)
         else:
-            body_copy = self.body[:-1]
-            body_copy.insert(0, body_copy[0] + self.direction)
-            self.body = body_copy[:]
+            position = self.cell_position(block)
+        surface, area = self.tail_sprites[link >> 2]
+        blits.append((surface, position, area))
+
+    def cell_position(self, block):  # The window position of a (possibly fractional) board position
+        x, y = self.camera.offset(block)
+        return round(x * self.cell_size[0]), round(y * self.cell_size[1])
+
+    def sliding(self, start, end):  # Where a sprite moving from start to end is drawn at this point in the tick
+        if self.alpha >= 1 or abs(end.x - start.x) + abs(end.y - start.y) != 1:  # Wrapping jumps straight across
+            return self.cell_position(end)
+        return self.cell_position(start.lerp(end, self.alpha))
+
+    @property
+    def body(self):  # The snake's body lives in the engine, this just hands it over in screen friendly vectors
+        return [Vector2(block) for block in self.engine.body]
+
+    @property
+    def direction(self):
+        return Vector2(self.engine.direction)
 
     def move_north(self):  # Moves snake up
-        if not self.south:
-            self.direction = Vector2(0, -1)
-            self.north = True
-            self.south = False
-            self.east = False
-            self.west = False
+        self.engine.turn(NORTH)
 
     def move_south(self):  # Moves snake down
-        if not self.north:
-            self.direction = Vector2(0, 1)
-            self.north = False
-            self.south = True
-            self.east = False
-            self.west = False
+        self.engine.turn(SOUTH)
 
     def move_east(self):  # Moves snake right
-        if not self.west:
-            self.direction = Vector2(1, 0)
-            self.north = False
-            self.south = False
-            self.east = True
-            self.west = False
+        self.engine.turn(EAST)
 
     def move_west(self):  # Moves snake left
-        if not self.east:
-            self.direction = Vector2(-1, 0)
-            self.north = False
-            self.south = False
-            self.east = False
-            self.west = True
-
-    def add_block(self):  # Adds block to the current snake
-        self.new_block = True
-
-    def walk_through_walls(self):  # Makes the snake come out the other side when they hit a wall
-        if self.body[0].x >= CELL_NUMBER - 1:
-            self.body[0].x -= CELL_NUMBER
-        if self.body[0].x < 0:
-            self.body[0].x += CELL_NUMBER
-        if self.body[0].y >= CELL_NUMBER - 1:
-            self.body[0].y -= CELL_NUMBER
-        if self.body[0].y < 0:
-            self.body[0].y += CELL_NUMBER
+        self.engine.turn(WEST)
 
     def reset(self):
-        self.body = self.start_position
-        self.direction = Vector2(1, 0)
+        self.engine.reset()
+
+
+class Camera:  # The part of the board in the window, which follows the head around boards too big to show whole
+    def __init__(self, engine, view_cells):
+        self.engine = engine
+        self.view_cells = view_cells
+        self.area = view_cells * view_cells
+        self.scrolls = engine.cell_number > view_cells
+        self.margin = view_cells // 5  # How close the head gets to an edge before the view moves
+        self.x = self.y = 0
+
+    def follow(self):  # Re-centres on the head once it nears an edge, returns True if the view moved
+        if not self.scrolls:
+            return False
+        n, view = self.engine.cell_number, self.view_cells
+        head_x, head_y = self.engine.position(self.engine.head)
+        moved = False
+        if not self.margin <= (head_x - self.x) % n < view - self.margin:
+            self.x = (head_x - view // 2) % n
+            moved = True
+        if not self.margin <= (head_y - self.y) % n < view - self.margin:
+            self.y = (head_y - view // 2) % n
+            moved = True
+        return moved
+
+    def offset(self, position):  # A board position relative to the top left of the view, wrapping like the board
+        n = self.engine.cell_number
+        return (position[0] - self.x) % n, (position[1] - self.y) % n
+
+    def sees(self, cell):
+        x, y = self.offset(self.engine.position(cell))
+        return x < self.view_cells and y < self.view_cells
+
+    def cells(self):  # Every board cell in view
+        n = self.engine.cell_number
+        columns = [(self.x + column) % n for column in range(self.view_cells)]
+        for row in range(self.view_cells):
+            start = (self.y + row) % n * n
+            for column in columns:
+                yield start + column
+
+
+class DirtyRegions:  # Keeps track of which board cells have changed since the last frame was drawn
+    def __init__(self, engine, camera):
+        self.engine = engine
+        self.camera = camera
+        self.cells = set()
+        self.full = True
+        self.state = None
+        self.sliding_cells = set()  # Cells the head and tail were drawn across last frame
+
+    def invalidate(self):  # Asks for the whole screen to be redrawn on the next frame
+        self.full = True
+
+    def collect(self, sliding=False):  # Compares the engine against the last drawn frame and notes what changed
+        engine = self.engine
+        state = (engine.head, engine.tail, engine.fruit, engine.score)
+        if state != self.state:
+            if self.state is not None:
+                old_head, old_tail, old_fruit, old_score = self.state
+                if old_score != engine.score:
+                    self.full = True
+                # The new head, the old head that is now the neck, the vacated tail, the new tail and both fruit spots
+                self.cells.update(cell for cell in (old_head, old_tail, old_fruit) + state[:3] if cell is not None)
+            self.state = state
+
+        # While the head and tail slide between cells they move every frame, not just every tick
+        self.cells.update(self.sliding_cells)
+        self.sliding_cells = set()
+        if sliding:
+            self.sliding_cells = {engine.head, engine.segment(1), engine.tail}
+            if engine.vacated is not None:
+                self.sliding_cells.add(engine.vacated)
+            self.cells.update(self.sliding_cells)
+
+    def rects(self, cell_size):  # The screen areas covered by the changed cells that are in view
+        cell_width, cell_height = cell_size
+        view, offset, position = self.camera.view_cells, self.camera.offset, self.engine.position
+        return [pygame.Rect(x * cell_width, y * cell_height, cell_width, cell_height)
+                for x, y in (offset(position(cell)) for cell in self.cells) if x < view and y < view]
+
+    def clear(self):
+        self.cells.clear()
+        self.full = False
 
 
 class Assets:  # The class that handles loading in game assets
-    def __init__(self):
+    def __init__(self, cell_size, cell_number, scale, source):
+        self.source = source
+        self.loader = ThreadPoolExecutor(max_workers=4, thread_name_prefix="assets")
+        resolution = (cell_size[0] * cell_number, cell_size[1] * cell_number)
+
         # Graphics
-        self.background = pygame.transform.scale(
-            (pygame.image.load("Graphics/water_background.png")), (CELL_SIZE * CELL_NUMBER, CELL_SIZE * CELL_NUMBER)
-        )
-        self.game_over = pygame.image.load("Graphics/game_over.png").convert_alpha()
-        self.press_spacebar_surface = pygame.image.load("Graphics/press_spacebar2.png").convert_alpha()
-        self.icon = pygame.image.load("Graphics/icon.png").convert_alpha()
-        self.resume_surface = pygame.image.load("Graphics/resume_button.png").convert_alpha()
-        self.pizza = pygame.image.load("Graphics/pizza_bubble.png").convert_alpha()
-        self.start_spacebar = pygame.image.load("Graphics/start_spacebar.png").convert_alpha()
-        self.start_rect = self.start_spacebar.get_rect(center=(500, 500))
-        self.button_options = pygame.image.load("Graphics/button_options.png").convert_alpha()
-        self.options_screen = pygame.image.load("Graphics/difficulty.png").convert_alpha()
-
-        # Sound
-        self.bgm = pygame.mixer.Sound("Sound/bgm.wav")
-        self.crunch = pygame.mixer.Sound("Sound/crunch.wav")
-        self.crash = pygame.mixer.Sound("Sound/crash.wav")
-
-    def play_bgm(self):  # Plays the background music
-        self.bgm.play(-1)
+        paths = dict(BOARD_SPRITES)
+        sizes = {name: cell_size for name in BOARD_SPRITES}
+        for name, (path, (width, height)) in MENU_SPRITES.items():
+            paths[name] = path
+            sizes[name] = (max(1, round(width * scale[0])), max(1, round(height * scale[1])))
+        sizes["background"] = resolution
+
+        start = [name for name in paths if name in BOARD_SPRITES or name in START_SPRITES]
+        menus = [name for name in paths if name not in start]
+        start_paths = {name: paths[name] for name in start}
+        start_sizes = {name: sizes[name] for name in start}
+        menu_paths = {name: paths[name] for name in menus}
+        menu_sizes = {name: sizes[name] for name in menus}
+        self.atlas = AtlasPages()
+        self.atlas.add(start, load_atlas("start", resolution, start_paths, start_sizes, source, self.loader))
+        self.atlas.add(menus, self.loader.submit(load_atlas, "menus", resolution, menu_paths, menu_sizes, source))
+        self.icon = source.image("Graphics/icon.png").convert_alpha()
+
+        # Sound, the music streams from its file once it starts so it isn't loaded here
+        self.sounds = {name: self.loader.submit(source.sound, path) for name, path in SOUNDS.items()}
+        self.sfx = SfxMixer()
+        self.music = Music(source)
+
+    def sound(self, name):  # Waits for a sound if it is still loading
+        return self.sounds[name].result()
+
+    def play_sound(self, name):  # Plays an effect through the SFX channels, which cap how many overlap
+        if self.sfx.enabled:
+            self.sfx.play(name, self.sound(name))
+
+    def play_bgm(self):  # Plays the background music, if there is any
+        self.music.play()
 
 
 class Game:
-    def __init__(self):
+    def __init__(self, seed=None, cell_number=CELL_NUMBER, window_size=None):
         # Game Initialisation
+        self.startup = StartupTimer(STARTED)
+        self.startup.mark("import")
+        self.startup_report = False
         pygame.init()
         pygame.display.set_caption("Hiss Noises")
+        self.source = open_source()
 
         # Game Constants
-        self.DUMMY_WINDOW = pygame.Surface((CELL_SIZE * CELL_NUMBER, CELL_SIZE * CELL_NUMBER))
-        self.SCREEN_DIMENSIONS = screen_dimensions(CELL_SIZE * CELL_NUMBER, CELL_SIZE * CELL_NUMBER)
+        # Cells are a whole number of pixels so every sprite can be scaled once up front and the grid never drifts
+        width, height = screen_dimensions(BOARD_SIZE, BOARD_SIZE) if window_size is None else window_size
+        self.CELL_NUMBER = cell_number
+        self.VIEW_CELLS = view = min(cell_number, VIEW_CELLS)
+        self.CELL_DIMENSIONS = (max(1, round(width / view)), max(1, round(height / view)))
+        self.SCREEN_DIMENSIONS = (self.CELL_DIMENSIONS[0] * view, self.CELL_DIMENSIONS[1] * view)
+        self.SCALE = (self.SCREEN_DIMENSIONS[0] / BOARD_SIZE, self.SCREEN_DIMENSIONS[1] / BOARD_SIZE)
         self.WINDOW = pygame.display.set_mode(self.SCREEN_DIMENSIONS)
         self.CLOCK = pygame.time.Clock()
         self.FPS = 60
         self.SCREEN_UPDATE = pygame.USEREVENT
-        self.FONT = pygame.font.SysFont('Impact', 50)
-        self.SCORE_FONT = pygame.font.Font("Font/white_shark_cre.ttf", 50)
+        self.SCORES_READY = pygame.USEREVENT + 1  # Posted by the score thread with a speed's best and the last rank
+        self.FONT = pygame.font.SysFont('Impact', max(1, round(50 * self.SCALE[1])))
+        self.SCORE_FONT = self.source.font("Font/white_shark_cre.ttf", max(1, round(50 * self.SCALE[1])))
 
         # Colours
         self.FADED_RED = (255, 120, 127)
@@ -245,89 +386,280 @@ class Game:
         # Game Variables
         self.running = False
         self.game_active = False
-        self.paused = False
-        self.selection_state = False
         self.score = 0
         self.high_score = 0
+        self.rank = None  # Where the last finished game placed at its speed, once the score thread has saved it
         self.game_speed = 100
-
-        # User Event Timers
-        pygame.time.set_timer(self.SCREEN_UPDATE, self.game_speed)
+        self.replay_dir = None  # Where to save a replay of each game, or None to not record
+        self.recorder = None
+        # Scores are synced to disk on a thread of their own, so saving one never holds up a frame
+        self.score_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scores")
+        self.leaderboard = self.score_writer.submit(Leaderboard)
+        self.fixed_timestep = True  # False goes back to ticking on a USEREVENT timer
+        self.interpolate = True
+        self.turn_queue = deque(maxlen=3)  # Turns pressed but not yet applied, at most one is used per tick
+        self.pending_presses = []  # When the timer drives the game, presses waiting for the next tick to show up
+
+        # Scheduling
+        self.scheduler = FixedTimestep(self.game_speed)
+        self.timing = TimingStats()
+        self.next_frame = 0.0
+        self.set_game_speed(self.game_speed)
 
         # Class Imports
-        self.assets = Assets()
-        self.fruit = Fruit(self.DUMMY_WINDOW, self.assets.pizza)
-        self.snake = Snake(self.DUMMY_WINDOW)
+        self.startup.mark("init")
+        self.assets = Assets(self.CELL_DIMENSIONS, self.VIEW_CELLS, self.SCALE, self.source)
+        self.startup.mark("asset decode")
+        self.engine = SnakeEngine(self.CELL_NUMBER, seed)
+        self.autopilot = None  # Steers the snake instead of the keyboard when switched on
+        self.connection = None  # The server being played on, if any
+        self.camera = Camera(self.engine, self.VIEW_CELLS)
+        self.fruit = Fruit(self.WINDOW, self.assets.atlas, self.CELL_DIMENSIONS, self.engine, self.camera)
+        self.snake = Snake(self.WINDOW, self.assets.atlas, self.CELL_DIMENSIONS, self.engine, self.camera)
+        self.dirty = DirtyRegions(self.engine, self.camera)
+        self.incremental_render = True
+        self.text_cache = TextCache(stretch=self.SCALE[0] / self.SCALE[1])
+        self.profiler = FrameProfiler()
+        self.scenes = []  # The scene stack, the last scene runs the main loop
+
+        # Score Panel
+        self.score_centre = self.scaled(BOARD_SIZE - 100, BOARD_SIZE - 40)
+        self.pizza_gap = self.scaled(5, 5)
+        self.panel_inset = self.scaled(6, 16)
+        self.panel_padding = self.scaled(18, 24)
+        self.panel_border = max(1, round(3 * self.SCALE[1]))
+        self.high_score_position = self.scaled(365, 800)
+        self.rank_position = self.scaled(365, 860)
+        self.score_panel = None
+        self.score_box_rect = pygame.Rect(0, 0, 0, 0)
         pygame.display.set_icon(self.assets.icon)
 
+    def scaled(self, x, y):  # Converts a position on the unscaled layout to a position in the window
+        return round(x * self.SCALE[0]), round(y * self.SCALE[1])
+
+    def draw_sprite(self, name, x, y):  # Draws a sprite at a position on the unscaled layout
+        self.assets.atlas.blit(self.WINDOW, name, self.scaled(x, y))
+
+    def render_text(self, text, colour):  # Renders text in the score font, stretched to match the layout's scale
+        return self.text_cache.render(self.SCORE_FONT, text, colour)
+
+    def layout_score_panel(self, score_size):  # Works out where the score box pieces go for a score of this size
+        score_rect = pygame.Rect((0, 0), score_size)
+        score_rect.center = self.score_centre
+        pizza_midright = (score_rect.left - self.pizza_gap[0], score_rect.centery)
+        pizza_rect = self.assets.atlas.get_rect("pizza", midright=pizza_midright)
+        bg_rect = pygame.Rect(pizza_rect.left - self.panel_inset[0], pizza_rect.top - self.panel_inset[1],
+                              pizza_rect.width + score_rect.width + self.panel_padding[0],
+                              pizza_rect.height + self.panel_padding[1])
+        self.score_panel = (score_size, score_rect, (pizza_rect.x, pizza_rect.y - self.pizza_gap[1]), bg_rect)
+        self.score_box_rect = bg_rect
+
+    def draw_background(self):
+        if not self.camera.scrolls:
+            self.assets.atlas.blit(self.WINDOW, "background", (0, 0))
+            return
+        # A scrolling board repeats the background every screenful, so at most four copies of it cover the view
+        width, height = self.SCREEN_DIMENSIONS
+        left = -(self.camera.x % self.VIEW_CELLS) * self.CELL_DIMENSIONS[0]
+        top = -(self.camera.y % self.VIEW_CELLS) * self.CELL_DIMENSIONS[1]
+        for x in (left, left + width) if left else (0,):
+            for y in (top, top + height) if top else (0,):
+                self.assets.atlas.blit(self.WINDOW, "background", (x, y))
+
+    def restore_background(self, rect):  # Redraws the background under one cell's rect
+        if not self.camera.scrolls:
+            self.assets.atlas.restore(self.WINDOW, "background", rect)
+            return
+        cell_width, cell_height = self.CELL_DIMENSIONS
+        x = (self.camera.x + rect.x // cell_width) % self.VIEW_CELLS
+        y = (self.camera.y + rect.y // cell_height) % self.VIEW_CELLS
+        area = pygame.Rect(x * cell_width, y * cell_height, rect.width, rect.height)
+        self.assets.atlas.blit_area(self.WINDOW, "background", rect.topleft, area)
+
     def display_score(self):  # Displays the current score and high score onscreen
         self.high_score = update_score(self.score, self.high_score)
-        hi_score = self.SCORE_FONT.render(f"High Score: {self.high_score}", True, self.WHITE)
-        score_surface = self.SCORE_FONT.render(f"Eaten: {self.score}", True, self.WHITE)
-
-        score_x = int(CELL_SIZE * CELL_NUMBER - 100)
-        score_y = int(CELL_SIZE * CELL_NUMBER - 40)
-        score_rect = score_surface.get_rect(center=(score_x, score_y))
-
-        pizza_rect = self.assets.pizza.get_rect(midright=(score_rect.left - 5, score_rect.centery))
+        score_surface = self.text_cache.render_number(self.SCORE_FONT, "Eaten: ", self.score, self.WHITE)
+        if self.score_panel is None or self.score_panel[0] != score_surface.get_size():
+            self.layout_score_panel(score_surface.get_size())
+        _, score_rect, pizza_position, bg_rect = self.score_panel
 
-        bg_rect = pygame.Rect(
-            pizza_rect.left - 6, pizza_rect.top - 16, pizza_rect.width + score_rect.width + 18, pizza_rect.height + 24)
-
-        self.DUMMY_WINDOW.blit(score_surface, score_rect)
-        self.DUMMY_WINDOW.blit(self.assets.pizza, (pizza_rect.x, pizza_rect.y - 5))
-        pygame.draw.rect(self.DUMMY_WINDOW, (124, 212, 255), bg_rect, 3)
+        self.WINDOW.blit(score_surface, score_rect)
+        self.assets.atlas.blit(self.WINDOW, "pizza", pizza_position)
+        pygame.draw.rect(self.WINDOW, (124, 212, 255), bg_rect, self.panel_border)
 
         if not self.game_active:
-            self.DUMMY_WINDOW.blit(hi_score, (365, 800))
+            hi_score = self.text_cache.render_number(self.SCORE_FONT, "High Score: ", self.high_score, self.WHITE)
+            self.WINDOW.blit(hi_score, self.high_score_position)
+            if self.rank is not None:
+                rank = self.text_cache.render_number(self.SCORE_FONT, "Rank: #", self.rank, self.WHITE)
+                self.WINDOW.blit(rank, self.rank_position)
 
-    def scale_window(self):  # Scales the game window and assets to fit the user's monitor dimensions
-        frame = pygame.transform.scale(self.DUMMY_WINDOW, self.SCREEN_DIMENSIONS)
-        self.WINDOW.blit(frame, frame.get_rect())
+    def update_window(self):  # Shows the finished frame
         pygame.display.flip()
 
-    def update(self):  # Updates the screen when something happens
-        self.snake.move_snake()
-        self.check_collision()
-        self.snake.walk_through_walls()
-        self.check_fail()
+    def redraw(self):  # Redraws the whole game without showing it
+        self.draw_background()
+        self.draw_elements()
+        self.display_score()
+        self.dirty.clear()
+
+    def draw_game(self):  # Draws the next frame the way the current render mode does, returning what to show
+        if self.incremental_render:
+            return self.draw_changes()
+        self.redraw()
+        return None
+
+    def draw_changes(self):  # Redraws what changed since the last frame and returns the rects to show, None for all
+        self.dirty.collect(self.snake.alpha < 1)
+        rects = self.dirty.rects(self.CELL_DIMENSIONS)
+        if self.dirty.full or self.score_box_rect.collidelist(rects) != -1:
+            self.redraw()
+            return None
+        if not rects:
+            return rects
+
+        for rect in rects:
+            self.restore_background(rect)
+        if self.engine.fruit in self.dirty.cells:
+            self.fruit.draw_fruit()
+        # Every segment on a changed cell, which after more than one tick in a frame is more than the ends and neck
+        occupied, index_of = self.engine.occupied, self.engine.index_of
+        self.snake.draw_blocks(sorted((index_of(cell) for cell in self.dirty.cells if occupied[cell]), reverse=True))
+        self.dirty.clear()
+        return rects
+
+    def present(self, rects):  # Shows what draw_changes drew
+        if rects is None:
+            self.update_window()
+        elif rects:
+            pygame.display.update(rects)
+
+    def draw_dirty(self):  # Redraws only the cells that changed since the last frame, or nothing if none did
+        self.present(self.draw_changes())
+
+    def toggle_profiler(self):  # Switches the frame profiler and its overlay on or off
+        if self.profiler.enabled:
+            self.profiler.disable()
+            self.dirty.invalidate()  # Clears the overlay off the board
+            return
+        self.profiler.enable([
+            (self, "handle_events", "events"),
+            (self, "update", "update"),
+            (self, "draw_game", "draw"),
+            # Incremental frames draw through draw_changes and only touch the snake's changed segments, so the snake
+            # is timed where both kinds of frame draw it. The score is only drawn on full redraws
+            (self, "draw_changes", "changes"),
+            (self.snake, "draw_blocks", "snake"),
+            (self, "display_score", "score"),
+            (self, "present", "present"),
+            (self, "wait_for_frame", "wait"),
+        ])
+
+    def export_profile(self):  # Saves the profiler's recent frames for a trace viewer
+        for path in self.profiler.export():
+            print(f"Saved {path}")
+
+    def set_game_speed(self, speed):  # Changes how many milliseconds each tick lasts
+        if self.recorder is not None and speed != self.game_speed:  # Changed from the pause menu mid-game
+            self.recorder.speed(self.engine.ticks, speed)
+        self.game_speed = speed
+        self.scheduler.set_step(speed)
+        self.load_high_score()
+        pygame.time.set_timer(self.SCREEN_UPDATE, 0)
+        if not self.fixed_timestep:
+            pygame.time.set_timer(self.SCREEN_UPDATE, speed)
+
+    def apply_queued_turn(self, now):  # Uses the first queued turn that actually changes direction
+        while self.turn_queue:
+            direction, pressed_at = self.turn_queue.popleft()
+            if direction != self.engine.direction and self.turn(direction):
+                self.timing.record_input(pressed_at, now)
+                return
+
+    def turn(self, direction):  # Turns the snake, recording the turn if this game is being recorded
+        if direction == self.engine.direction:  # Keeping its heading is no turn, so nothing is recorded
+            return False
+        if not self.engine.turn(direction):
+            return False
+        if self.recorder is not None:
+            self.recorder.turn(self.engine.ticks, direction)
+        return True
+
+    def start_recording(self):  # Starts a new replay file for the game about to be played, if recording is on
+        self.stop_recording()
+        if self.replay_dir is None:
+            return
+        os.makedirs(self.replay_dir, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{self.engine.seed}{EXTENSION}"
+        self.recorder = ReplayWriter(os.path.join(self.replay_dir, name), self.engine.seed, self.CELL_NUMBER,
+                                     self.game_speed)
+
+    def stop_recording(self):  # Finishes the replay with the final score if the game is over, or just closes it
+        if self.recorder is None:
+            return
+        if self.engine.alive:
+            self.recorder.close()
+        else:
+            self.recorder.finish(self.engine.ticks, self.engine.score, self.engine.length)
+        self.recorder = None
+
+    def toggle_autopilot(self):  # Hands the snake to the autopilot, or back to the player
+        if self.autopilot is None:
+            self.autopilot = Autopilot(self.engine)
+        else:
+            self.autopilot = None
+
+    def update(self):  # Advances the game one tick and reacts to whatever happened
+        now = time.perf_counter()
+        self.timing.record_tick(now)
+        if self.autopilot is not None:
+            self.turn_queue.clear()
+            self.turn(self.autopilot.decide())
+        self.apply_queued_turn(now)
+        for direction, pressed_at in self.pending_presses:
+            if direction == self.engine.direction:
+                self.timing.record_input(pressed_at, now)
+            else:  # Another press overwrote it before the snake ever moved
+                self.timing.record_lost()
+        self.pending_presses.clear()
+
+        events = self.engine.step()
+        if self.camera.follow():
+            self.dirty.invalidate()
+        self.dirty.collect()  # Each tick's changes, in case another tick comes before the next frame
+        self.check_collision(events)
+        self.check_fail(events)
 
     def draw_elements(self):  # Draws the specified elements onscreen
-        self.fruit.draw_fruit(CELL_SIZE)
+        self.fruit.draw_fruit()
         self.snake.draw_snake()
 
-    def check_collision(self):  # Checks to see if the head of the snake has collided with the fruit
-        if self.fruit.pos == self.snake.body[0]:
-            self.fruit.randomise()
-            self.snake.add_block()
-            self.assets.crunch.play()
-            self.score += 1
+    def check_collision(self, events):  # Checks to see if the head of the snake has collided with the fruit
+        if ATE in events:
+            self.assets.play_sound("crunch")
+            self.score = self.engine.score
 
-        for block in self.snake.body[1:]:
-            if block == self.fruit.pos:
-                self.fruit.randomise()
-
-    def check_fail(self):  # Checks to see if the snake hits itself
-        for block in self.snake.body[1:]:
-            if block == self.snake.body[0]:
-                self.assets.crash.play()
-                self.game_over_screen()
+    def check_fail(self, events):  # Checks to see if the snake hits itself
+        if DIED in events:
+            self.assets.play_sound("crash")
+            self.stop_recording()
+            self.game_over_screen()
 
     def key_presses(self, event):  # Handles the relevant key presses to control the game
-        if event.key == pygame.K_UP:
-            self.snake.move_north()
-        if event.key == pygame.K_DOWN:
-            self.snake.move_south()
-        if event.key == pygame.K_LEFT:
-            self.snake.move_west()
-        if event.key == pygame.K_RIGHT:
-            self.snake.move_east()
+        direction = TURN_KEYS.get(event.key)
+        if direction is not None and self.fixed_timestep:
+            if len(self.turn_queue) == self.turn_queue.maxlen:
+                self.timing.record_lost()
+            self.turn_queue.append((direction, time.perf_counter()))
+        elif direction is not None:
+            if self.turn(direction):
+                self.pending_presses.append((direction, time.perf_counter()))
         if event.key == pygame.K_ESCAPE:
             self.pause_game()
 
     def difficulty_selection_screen(self):
         def speed_text(colour, text=""):
-            speech = self.SCORE_FONT.render(f"Current Speed: {text}", True, colour)
+            speech = self.render_text(f"Current Speed: {text}", colour)
             return speech
 
         easy_text = speed_text(self.WHITE, "Easy")
@@ -335,172 +667,235 @@ class Game:
         hard_text = speed_text(self.FADED_RED, "Hard")
         twenty_text = speed_text(self.RED, "2020")
 
-        self.DUMMY_WINDOW.blit(self.assets.background, (0, 0))
-        self.DUMMY_WINDOW.blit(self.assets.options_screen, (313, 254))
+        self.draw_background()
+        self.draw_sprite("options_screen", 313, 254)
 
         if self.game_speed == 150:
-            self.DUMMY_WINDOW.blit(easy_text, (304, 748))
+            self.WINDOW.blit(easy_text, self.scaled(304, 748))
 
         if self.game_speed == 100:
-            self.DUMMY_WINDOW.blit(medium_text, (305, 748))
+            self.WINDOW.blit(medium_text, self.scaled(305, 748))
 
         if self.game_speed == 50:
-            self.DUMMY_WINDOW.blit(hard_text, (305, 748))
+            self.WINDOW.blit(hard_text, self.scaled(305, 748))
 
         if self.game_speed == 10:
-            self.DUMMY_WINDOW.blit(twenty_text, (309, 748))
+            self.WINDOW.blit(twenty_text, self.scaled(309, 748))
 
-    def difficulty_selection_settings(self):
-        self.selection_state = True
-
-        while self.selection_state:
-            self.difficulty_selection_screen()
-
-            mx, my = pygame.mouse.get_pos()
-
-            for event in pygame.event.get():
-                click = True if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 else False
-
-                if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
-                    self.DUMMY_WINDOW.blit(self.assets.background, (0, 0))
-                    self.selection_state = False
-
-                self.difficulty_button_click(event, mx, my, click)
-
-                if event.type == pygame.QUIT:
-                    game_quit()
-
-            self.scale_window()
-            self.CLOCK.tick(self.FPS)
-
-    def difficulty_button_click(self, event, mx, my, click, ):
-        easy_rect = pygame.Rect(331, 430, 337, 67)
-        medium_rect = pygame.Rect(331, 505, 337, 67)
-        hard_rect = pygame.Rect(331, 583, 337, 67)
-        twenty_twenty_rect = pygame.Rect(331, 662, 337, 67)
-
-        if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
-            self.DUMMY_WINDOW.blit(self.assets.background, (0, 0))
-            self.selection_state = False
-
-        if easy_rect.collidepoint((mx, my)) and click:
-            pygame.time.set_timer(self.SCREEN_UPDATE, 0)
-            self.game_speed = 150
-            pygame.time.set_timer(self.SCREEN_UPDATE, self.game_speed)
-            self.selection_state = False
-            self.paused = False
-
-        if medium_rect.collidepoint((mx, my)) and click:
-            pygame.time.set_timer(self.SCREEN_UPDATE, 0)
-            self.game_speed = 100
-            pygame.time.set_timer(self.SCREEN_UPDATE, self.game_speed)
-            self.selection_state = False
-            self.paused = False
-
-        if hard_rect.collidepoint((mx, my)) and click:
-            pygame.time.set_timer(self.SCREEN_UPDATE, 0)
-            self.game_speed = 50
-            pygame.time.set_timer(self.SCREEN_UPDATE, self.game_speed)
-            self.selection_state = False
-            self.paused = False
-
-        if twenty_twenty_rect.collidepoint((mx, my)) and click:
-            pygame.time.set_timer(self.SCREEN_UPDATE, 0)
-            self.game_speed = 10
-            pygame.time.set_timer(self.SCREEN_UPDATE, self.game_speed)
-            self.selection_state = False
-            self.paused = False
+    def difficulty_button_at(self, position):  # The speed of the difficulty button at a position, if there is one
+        button_size = self.scaled(337, 67)
+        buttons = ((150, (331, 430)), (100, (331, 505)), (50, (331, 583)), (10, (331, 662)))
+        for speed, (x, y) in buttons:
+            if pygame.Rect(self.scaled(x, y), button_size).collidepoint(position):
+                return speed
+        return None
 
     def pause_game(self):  # Pauses the game
-        self.paused = True
-        resume_rect = self.assets.resume_surface.get_rect(center=self.WINDOW.get_rect().center)
-        options_rect = self.assets.button_options.get_rect(topright=self.WINDOW.get_rect().topright)
-        while self.paused:
-            self.draw_elements()
-            self.display_score()
-            self.DUMMY_WINDOW.blit(self.assets.resume_surface, (294, 430))
-            self.DUMMY_WINDOW.blit(self.assets.button_options, (800, 0))
+        self.push_scene(PauseScene(self))
 
-            mx, my = pygame.mouse.get_pos()
-
-            for event in pygame.event.get():
-                click = True if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 else False
-
-                if resume_rect.collidepoint((mx, my)) and click or \
-                        event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
-                    self.paused = False
-                    self.selection_state = False
-
-                if options_rect.collidepoint((mx, my)) and click:
-                    self.difficulty_selection_settings()
-
-                if event.type == pygame.QUIT:
-                    game_quit()
+    def difficulty_selection_settings(self):
+        self.push_scene(OptionsScene(self))
 
-            self.scale_window()
-            self.CLOCK.tick(self.FPS)
+    def resume_play(self):  # Picks the game back up after a menu without redrawing stale cells or owing missed ticks
+        self.camera.follow()
+        self.dirty.invalidate()
+        self.scheduler.reset()
+        self.timing.pause()
+        self.turn_queue.clear()
+        self.pending_presses.clear()
 
     def game_clear(self):  # Clears the relevant game variables to start a new session
         self.snake.reset()
         self.score = 0
-
-    def game_over_screen(self):  # Draws the game over screen
+        if self.autopilot is not None:
+            self.autopilot.reset()
+        self.start_recording()
+
+    def load_high_score(self):  # Fetches the best score at the current speed from the leaderboard
+        self.rank = None
+        self.score_writer.submit(self.post_scores, self.game_speed)
+
+    def save_score(self):  # Adds the finished game to the leaderboard, its rank arriving later as an event
+        self.rank = None
+        if self.autopilot is None:  # Games the autopilot played don't count
+            self.score_writer.submit(self.post_scores, self.game_speed, self.score, self.engine.seed)
+
+    def post_scores(self, speed, score=None, seed=0):  # Runs on the score thread, never the one drawing
+        try:
+            leaderboard = self.leaderboard.result()
+            rank = None if score is None else leaderboard.add(speed, score, seed)
+            best = leaderboard.best(speed)
+        except OSError as error:
+            print(f"Couldn't save the score: {error}", file=sys.stderr)
+            return
+        if pygame.display.get_init():  # The score is saved even if the game quit while it was being written
+            pygame.event.post(pygame.event.Event(self.SCORES_READY, speed=speed, best=best, rank=rank))
+
+    def game_over_screen(self):  # Swaps the game for the game over screen
+        self.save_score()
         self.game_active = False
-        while not self.game_active and self.running:
-            for event in pygame.event.get():
-                if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE or event.type == pygame.QUIT:
-                    self.running = False
-                    game_quit()
-
-                if event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
-                    self.game_clear()
-                    self.game_active = True
-
-            self.DUMMY_WINDOW.blit(self.assets.background, (0, 0))
-            self.DUMMY_WINDOW.blit(self.assets.game_over, (268, 268))
-            self.DUMMY_WINDOW.blit(self.assets.press_spacebar_surface, (260, 21))
-            self.display_score()
-            self.scale_window()
-
-    def start_screen(self):  # Draws the start screen
-        while not self.running:
-            self.DUMMY_WINDOW.fill(self.WHITE)
-            for events in pygame.event.get():
-                if events.type == pygame.KEYDOWN and events.key == pygame.K_SPACE:
-                    self.running = True
-                    self.game_active = True
-                if events.type == pygame.QUIT:
-                    game_quit()
-
-            self.DUMMY_WINDOW.blit(self.assets.background, (0, 0))
-            self.draw_elements()
-            self.DUMMY_WINDOW.blit(self.assets.start_spacebar, (163, 315))
-            self.scale_window()
-
-    def main(self):  # The main game loop
-        self.assets.play_bgm()
-
-        self.start_screen()
-
-        while self.running:
-            self.DUMMY_WINDOW.blit(self.assets.background, (0, 0))
-
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    game_quit()
-
-                if event.type == self.SCREEN_UPDATE:
-                    self.update()
-
-                if event.type == pygame.KEYDOWN and self.game_active:
-                    self.key_presses(event)
-
-            self.draw_elements()
-            self.display_score()
-            self.scale_window()
+        self.replace_scene(GameOverScene(self))
+
+    def push_scene(self, scene):  # Puts a scene on top of the stack, where it takes over the main loop
+        self.scenes.append(scene)
+        scene.enter()
+
+    def pop_scene(self, count=1):  # Drops scenes off the top, handing the loop back to the one underneath
+        del self.scenes[-count:]
+        if self.scenes:
+            self.scenes[-1].enter()
+
+    def replace_scene(self, scene):  # Swaps the top scene for another, so moving between screens never nests
+        if self.scenes:
+            self.scenes.pop()
+        self.push_scene(scene)
+
+    def dispatch(self, events):  # Hands each event to whichever scene is on top when it arrives
+        for event in events:
+            if event.type == pygame.QUIT:
+                game_quit()
+            if event.type in EXPOSE_EVENTS:
+                self.dirty.invalidate()  # Incremental frames only cover changed cells, so the next one redraws all
+                if self.scenes:
+                    self.scenes[-1].needs_redraw = True
+            if event.type == self.SCORES_READY and event.speed == self.game_speed:
+                self.high_score = event.best
+                self.rank = event.rank
+                if self.scenes:
+                    self.scenes[-1].needs_redraw = True
+            if self.scenes:
+                self.scenes[-1].handle_event(event)
+
+    def main(self, scene=None):  # The main game loop, run by whichever scene is on top of the stack
+        self.push_scene(StartScene(self) if scene is None else scene)
+        while self.scenes:
+            self.scenes[-1].run()
+
+    def play_frame(self):  # One pass of the main loop: input, any ticks that are due, drawing, then waiting
+        self.handle_events()
+        if self.scenes and not self.scenes[-1].animated:
+            return  # A menu opened, so the game stops here until it is closed
+
+        if self.fixed_timestep:
+            self.scheduler.advance(time.perf_counter())
+            while self.scheduler.due():
+                self.update()
+            self.snake.alpha = self.scheduler.alpha if self.interpolate else 1.0
+
+        now = time.perf_counter()
+        if now >= self.next_frame:
+            self.next_frame = max(self.next_frame + 1 / self.FPS, now)
+            rects = self.draw_game()
+            if self.profiler.enabled:
+                rects = self.profiler.draw_overlay(self.WINDOW, rects)
+            self.present(rects)
+            if self.profiler.enabled:
+                self.profiler.mark_frame()
+
+        self.wait_for_frame()
+
+    def handle_events(self):
+        events = pygame.event.get()
+        if self.scenes:
+            self.dispatch(events)
+            return
+        for event in events:  # Driven directly, with no scenes, by the benchmarks
+            if event.type == pygame.QUIT:
+                game_quit()
+            self.handle_event(event)
+
+    def handle_event(self, event):  # Reacts to one event while the game is being played
+        if event.type == self.SCREEN_UPDATE and not self.fixed_timestep:
+            self.update()
+
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_F2:
+            self.toggle_autopilot()
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+            self.toggle_profiler()
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_F4 and self.profiler.frames:
+            self.export_profile()
+        elif event.type == pygame.KEYDOWN and self.game_active:
+            self.key_presses(event)
+
+    def join_server(self, connection):  # Plays in a room on a server, which does the ticking, instead of locally
+        self.connection = connection
+        self.running = self.game_active = True
+        self.main(NetworkScene(self))
+
+    def network_frame(self):  # Waits up to a frame for the server, then draws whatever it sent
+        connection = self.connection
+        received = connection.poll(1 / self.FPS)
+        self.dispatch(pygame.event.get())
+        if connection.closed:
+            print("The server closed the connection")
+            game_quit()
+        scene = self.scenes[-1]
+        if received or scene.needs_redraw:
+            scene.needs_redraw = False
+            self.draw_room()
+            self.update_window()
+
+    def draw_room(self):  # Draws the server's room around the player's snake
+        mirror = self.connection.mirror
+        player = mirror.player
+        if player is not None:  # While it waits to respawn the view stays where it died
+            self.camera.engine = player
+            self.score = player.score
+        self.camera.follow()
+        self.draw_background()
+        cell_width, cell_height = self.CELL_DIMENSIONS
+        for fruit in mirror.fruits:
+            if fruit is not None and self.camera.sees(fruit):
+                x, y = self.camera.offset(self.engine.position(fruit))
+                self.assets.atlas.blit(self.WINDOW, "pizza", (x * cell_width, y * cell_height))
+        for snake in mirror.snakes.values():  # One Snake draws them all in turn, its sprite tables are resolved once
+            self.snake.engine = snake
+            self.snake.draw_snake()
+        self.display_score()
+
+    def network_key(self, key):  # Sends turns to the server, Escape leaves
+        direction = TURN_KEYS.get(key)
+        if direction is not None:
+            self.connection.send_turn(CODES[direction])
+        elif key == pygame.K_ESCAPE:
+            game_quit()
+
+    def wait_for_frame(self):
+        if self.fixed_timestep:
+            # Sleep until whichever comes first, the next tick or the next frame, so ticks land on time
+            wake_in = min(self.scheduler.time_to_next(), self.next_frame - time.perf_counter())
+            pygame.time.wait(max(0, int(wake_in * 1000)))
+        else:
             self.CLOCK.tick(self.FPS)
 
 
 if __name__ == '__main__':
-    game = Game()
-    game.main()
+    parser = argparse.ArgumentParser(description="Hiss Noises")
+    parser.add_argument("--startup-report", action="store_true", help="Print how long each startup phase took")
+    parser.add_argument("--record", metavar="DIR", help="Save a replay of every game into this directory")
+    parser.add_argument("--cells", type=board_size, default=CELL_NUMBER, help="Board size, boards over "
+                        f"{VIEW_CELLS} cells across scroll")
+    parser.add_argument("--autopilot", action="store_true", help="Let the autopilot play (F2 toggles it)")
+    parser.add_argument("--profile", action="store_true", help="Start with the frame profiler on (F3 toggles it, "
+                                                               "F4 saves a trace)")
+    parser.add_argument("--connect", metavar="HOST[:PORT]", help="Play on a multiplayer server instead")
+    parser.add_argument("--room", type=int, default=0, help="Room to join on the server, 0 for any with space")
+    args = parser.parse_args()
+
+    if args.connect:
+        host, _, port = args.connect.partition(":")
+        try:
+            connection = Connection(host, int(port or PORT), args.room)
+        except OSError as error:
+            parser.exit(1, f"Couldn't join {args.connect}: {error}\n")
+        game = Game(cell_number=connection.mirror.cell_number)
+        game.join_server(connection)
+    else:
+        game = Game(cell_number=args.cells)
+        game.startup_report = args.startup_report
+        game.replay_dir = args.record
+        if args.autopilot:
+            game.toggle_autopilot()
+        if args.profile:
+            game.toggle_profiler()
+        game.main()
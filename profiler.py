@@ -0,0 +1,131 @@
+import csv
+import json
+import os
+import time
+from collections import deque
+
+import pygame
+
+from scheduler import percentile
+
+PROFILE_DIR = "profiles"
+OVERLAY_SIZE = (320, 190)
+GRAPH_HEIGHT = 80
+GRAPH_MS = 50  # Frame time at the top of the graph
+STATS_INTERVAL = 0.25  # Seconds between refreshes of the overlay's numbers, so reading them isn't a blur
+
+
+class FrameProfiler:  # Times the game's hot paths frame by frame into a ring buffer while it is switched on
+    def __init__(self, frames=600):
+        self.enabled = False
+        self.frames = deque(maxlen=frames)  # (start, end, [(phase, start, end), ...]) per frame, oldest first
+        self.records = []
+        self.frame_start = 0.0
+        self.wrapped = []
+        self.font = None
+        self.stats_surface = None
+        self.stats_time = 0.0
+
+    def enable(self, targets):  # Wraps each (object, method name, phase) so its calls get timed
+        if self.enabled:
+            return
+        for obj, name, phase in targets:
+            setattr(obj, name, self.timed(getattr(obj, name), phase))
+            self.wrapped.append((obj, name))
+        self.enabled = True
+        self.frame_start = 0.0
+
+    def disable(self):  # Takes the wrappers off again, so a profiler that's off costs nothing
+        for obj, name in self.wrapped:
+            delattr(obj, name)
+        self.wrapped.clear()
+        self.enabled = False
+
+    def timed(self, method, phase):
+        records, clock = self.records, time.perf_counter
+
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                records.append((phase, start, clock()))
+        return wrapper
+
+    def mark_frame(self):  # Called as each frame is shown, closing the frame before and everything timed during it
+        now = time.perf_counter()
+        if self.frame_start:
+            self.frames.append((self.frame_start, now, list(self.records)))
+        self.records.clear()
+        self.frame_start = now
+
+    def phase_totals(self):  # Each phase's time per frame in milliseconds, for the frames it ran in
+        totals = {"frame": [(end - start) * 1000 for start, end, _ in self.frames]}
+        for _, _, records in self.frames:
+            frame = {}
+            for phase, start, end in records:
+                frame[phase] = frame.get(phase, 0.0) + (end - start) * 1000
+            for phase, total in frame.items():
+                totals.setdefault(phase, []).append(total)
+        return totals
+
+    def summary(self):  # Rolling p50, p95 and p99 per phase
+        return {phase: (percentile(values, 0.5), percentile(values, 0.95), percentile(values, 0.99))
+                for phase, values in self.phase_totals().items()}
+
+    def draw_overlay(self, target, rects):  # Draws the graph and numbers, adding their area to the rects to show
+        if self.font is None:
+            self.font = pygame.font.SysFont("consolas", 14)
+        width, height = min(OVERLAY_SIZE[0], target.get_width()), min(OVERLAY_SIZE[1], target.get_height())
+        area = pygame.Rect(0, 0, width, height)
+        target.fill((20, 20, 30), area)
+
+        # Frame times, newest on the right, with a line at 60 fps
+        frames = list(self.frames)[-width:]
+        scale = GRAPH_HEIGHT / GRAPH_MS
+        for x, (start, end, _) in enumerate(frames, width - len(frames)):
+            bar = min(GRAPH_HEIGHT, round((end - start) * 1000 * scale))
+            colour = (83, 255, 121) if (end - start) * 1000 <= 1000 / 60 else (255, 120, 127)
+            target.fill(colour, (x, GRAPH_HEIGHT - bar, 1, bar))
+        target.fill((124, 212, 255), (0, GRAPH_HEIGHT - round(1000 / 60 * scale), width, 1))
+
+        now = time.perf_counter()
+        if self.stats_surface is None or now - self.stats_time > STATS_INTERVAL:
+            self.stats_surface = self.render_stats()
+            self.stats_time = now
+        target.blit(self.stats_surface, (4, GRAPH_HEIGHT + 4))
+        return None if rects is None else rects + [area]
+
+    def render_stats(self):
+        lines = [f"{'ms':<8}{'p50':>7}{'p95':>7}{'p99':>7}"]
+        lines += [f"{phase:<8}{p50:>7.2f}{p95:>7.2f}{p99:>7.2f}" for phase, (p50, p95, p99) in self.summary().items()]
+        line_height = self.font.get_linesize()
+        surface = pygame.Surface((OVERLAY_SIZE[0], line_height * len(lines)), pygame.SRCALPHA)
+        for row, line in enumerate(lines):
+            surface.blit(self.font.render(line, True, (230, 234, 255)), (0, row * line_height))
+        return surface
+
+    def export(self, directory=PROFILE_DIR):  # Saves the buffered frames as a Chrome trace and a CSV
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, f"profile-{time.strftime('%Y%m%d-%H%M%S')}")
+        origin = self.frames[0][0] if self.frames else 0.0
+
+        def micros(seconds):
+            return round((seconds - origin) * 1e6, 1)
+
+        events = []
+        with open(base + ".csv", "w", newline="") as table:
+            writer = csv.writer(table)
+            writer.writerow(["frame", "phase", "start_ms", "duration_ms"])
+            for index, (start, end, records) in enumerate(self.frames):
+                events.append({"name": "frame", "ph": "X", "pid": 1, "tid": 1, "ts": micros(start),
+                               "dur": round((end - start) * 1e6, 1), "args": {"frame": index}})
+                writer.writerow([index, "frame", f"{(start - origin) * 1000:.3f}", f"{(end - start) * 1000:.3f}"])
+                for phase, phase_start, phase_end in records:
+                    events.append({"name": phase, "ph": "X", "pid": 1, "tid": 1, "ts": micros(phase_start),
+                                   "dur": round((phase_end - phase_start) * 1e6, 1)})
+                    writer.writerow([index, phase, f"{(phase_start - origin) * 1000:.3f}",
+                                     f"{(phase_end - phase_start) * 1000:.3f}"])
+        with open(base + ".json", "w") as trace:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, trace)
+        return base + ".json", base + ".csv"
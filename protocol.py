@@ -0,0 +1,310 @@
+import select
+import socket
+import struct
+from collections import Counter, deque
+
+from engine import link_code
+from replay import CODES, DIRECTIONS
+from varint import get_varint, put_varint
+
+PORT = 5170
+LENGTH = struct.Struct("<I")  # Every message goes out behind its length in bytes
+MAX_MESSAGE = 1 << 20
+
+# The first byte of every message says what it is, the rest is varints
+WELCOME = 1  # Server: the player's snake id, the board size and the tick length in milliseconds
+KEYFRAME = 2  # Server: the whole room, sent on joining and every so often after
+DELTA = 3  # Server: what changed in one tick
+JOIN = 4  # Client: the room to join, 0 for any room with space
+TURN = 5  # Client: a direction code, its index in DIRECTIONS
+REJECT = 6  # Server: the join was refused, for a reason from REJECT_REASONS, and the connection is closing
+
+ROOMS_FULL = 1
+REJECT_REASONS = {ROOMS_FULL: "every room on the server is full"}
+
+# A delta holds an id and a flags byte per snake. A snake that moved has the direction code its head went in in the
+# low two bits, so a move costs two bytes however long the snake is
+MOVE_MASK = 3
+TAIL = 4  # The tail left its cell
+ATE = 8
+GONE = 16  # Crashed or left, its body comes off the board
+SPAWNED = 32  # A new snake, its length and cells follow head first
+
+
+def frame(payload):  # Puts the length in front of a message
+    return LENGTH.pack(len(payload)) + payload
+
+
+def message(kind, *values):  # A message made of nothing but varints
+    payload = bytearray([kind])
+    for value in values:
+        put_varint(payload, value)
+    return frame(payload)
+
+
+async def read_message(reader):  # Reads one message off an asyncio stream
+    size, = LENGTH.unpack(await reader.readexactly(LENGTH.size))
+    if size > MAX_MESSAGE:
+        raise ValueError(f"message of {size} bytes is too long")
+    return await reader.readexactly(size)
+
+
+def encode_keyframe(arena, server_ticks, server_overruns):
+    # The server's own tick and overrun counts ride along, so a client can tell when the server falls behind
+    payload = bytearray([KEYFRAME])
+    for value in (arena.ticks, server_ticks, server_overruns, len(arena.fruits)):
+        put_varint(payload, value)
+    for fruit in arena.fruits:
+        put_varint(payload, 0 if fruit is None else fruit + 1)
+    put_varint(payload, len(arena.snakes))
+    for snake in arena.snakes.values():
+        for value in (snake.id, snake.score, snake.length):
+            put_varint(payload, value)
+        for cell in snake.body:
+            put_varint(payload, cell)
+    return frame(payload)
+
+
+def encode_delta(arena, moved, gone, spawned, eaten):  # Snakes that moved and then crashed only go out as gone
+    payload = bytearray([DELTA])
+    put_varint(payload, arena.ticks)
+    live = [snake for snake in moved if snake.alive]
+    put_varint(payload, len(live) + len(gone) + len(spawned))
+    for snake in live:
+        put_varint(payload, snake.id)
+        flags = CODES[snake.heading]
+        if snake.vacated is not None:
+            flags |= TAIL
+        if snake.new_block:
+            flags |= ATE
+        payload.append(flags)
+    for snake_id in gone:
+        put_varint(payload, snake_id)
+        payload.append(GONE)
+    for snake in spawned:
+        put_varint(payload, snake.id)
+        payload.append(SPAWNED)
+        put_varint(payload, snake.length)
+        for cell in snake.body:
+            put_varint(payload, cell)
+    put_varint(payload, len(eaten))
+    for slot in eaten:
+        fruit = arena.fruits[slot]
+        put_varint(payload, slot)
+        put_varint(payload, 0 if fruit is None else fruit + 1)
+    return frame(payload)
+
+
+class MirrorSnake:  # A snake as a client sees it, shaped enough like SnakeEngine for the game's Snake to draw it
+    def __init__(self, cell_number, cells, score=0):
+        self.cell_number = cell_number
+        self.body = deque()
+        self.links = deque()  # Link codes per segment, as SnakeEngine keeps them
+        self.occupied = Counter()
+        self.slot = {}  # Cell -> how many heads had been pushed when it became the head, for index_of
+        self.pushed = 0
+        self.vacated = None
+        self.score = score
+        for cell in reversed(cells):
+            self.push_head(cell)
+
+    @property
+    def head(self):
+        return self.body[0]
+
+    @property
+    def tail(self):
+        return self.body[-1]
+
+    @property
+    def length(self):
+        return len(self.body)
+
+    def position(self, cell):
+        y, x = divmod(cell, self.cell_number)
+        return x, y
+
+    def segment(self, index):
+        return self.body[index]
+
+    def link(self, index):
+        return self.links[index]
+
+    def index_of(self, cell):
+        return self.pushed - self.slot[cell]
+
+    def push_head(self, cell):
+        self.pushed += 1
+        if self.body:
+            ahead = link_code(self.cell_number, self.body[0], cell)
+            self.links[0] = self.links[0] & 3 | ahead << 2
+            self.links.appendleft(ahead ^ 1)
+        else:
+            self.links.appendleft(0)
+        self.body.appendleft(cell)
+        self.slot[cell] = self.pushed
+        self.occupied[cell] += 1
+
+    def pop_tail(self):
+        cell = self.body.pop()
+        self.links.pop()
+        self.occupied[cell] -= 1
+        if not self.occupied[cell]:
+            del self.occupied[cell]
+            del self.slot[cell]
+        return cell
+
+    def move(self, direction, tail):  # Moves the head one cell, wrapping like the server, dropping the tail if it left
+        n = self.cell_number
+        y, x = divmod(self.body[0], n)
+        dx, dy = direction
+        self.vacated = self.pop_tail() if tail else None
+        self.push_head((y + dy) % n * n + (x + dx) % n)
+
+
+class ArenaMirror:  # The client's copy of a room, rebuilt by each keyframe and moved on by each delta
+    def __init__(self):
+        self.snake_id = None
+        self.cell_number = None
+        self.tick_ms = None
+        self.tick = 0
+        self.snakes = {}
+        self.fruits = []
+        self.synced = False  # Whether a keyframe has arrived since joining
+        self.rejected = None  # The reason code, if the server turned the join down
+        self.server_ticks = self.server_overruns = 0
+        self.keyframes = 0
+        self.desyncs = 0  # Keyframes that didn't match what the deltas had built, which should never happen
+
+    @property
+    def player(self):  # The player's own snake, None while it waits to respawn
+        return self.snakes.get(self.snake_id)
+
+    def apply(self, payload):
+        kind = payload[0]
+        if kind == WELCOME:
+            self.welcome(payload)
+        elif kind == KEYFRAME:
+            self.keyframe(payload)
+        elif kind == DELTA and self.synced:
+            self.delta(payload)
+        elif kind == REJECT:
+            self.rejected = get_varint(payload, 1)[0]
+
+    def welcome(self, payload):
+        self.snake_id, offset = get_varint(payload, 1)
+        self.cell_number, offset = get_varint(payload, offset)
+        self.tick_ms, offset = get_varint(payload, offset)
+
+    def state(self):  # Everything a keyframe carries, for comparing against one
+        return self.tick, self.fruits, {snake_id: (list(snake.body), snake.score)
+                                        for snake_id, snake in self.snakes.items()}
+
+    def keyframe(self, payload):
+        before = self.state() if self.synced else None
+        self.tick, offset = get_varint(payload, 1)
+        self.server_ticks, offset = get_varint(payload, offset)
+        self.server_overruns, offset = get_varint(payload, offset)
+        count, offset = get_varint(payload, offset)
+        fruits = []
+        for _ in range(count):
+            fruit, offset = get_varint(payload, offset)
+            fruits.append(fruit - 1 if fruit else None)
+        self.fruits = fruits
+        count, offset = get_varint(payload, offset)
+        snakes = {}
+        for _ in range(count):
+            snake_id, offset = get_varint(payload, offset)
+            score, offset = get_varint(payload, offset)
+            cells, offset = self.read_cells(payload, offset)
+            snakes[snake_id] = MirrorSnake(self.cell_number, cells, score)
+        self.snakes = snakes
+        self.keyframes += 1
+        if before is not None and before != self.state():
+            self.desyncs += 1
+        self.synced = True
+
+    def read_cells(self, payload, offset):  # A length and that many cells
+        length, offset = get_varint(payload, offset)
+        cells = []
+        for _ in range(length):
+            cell, offset = get_varint(payload, offset)
+            cells.append(cell)
+        return cells, offset
+
+    def delta(self, payload):
+        self.tick, offset = get_varint(payload, 1)
+        count, offset = get_varint(payload, offset)
+        for _ in range(count):
+            snake_id, offset = get_varint(payload, offset)
+            flags = payload[offset]
+            offset += 1
+            if flags & GONE:
+                self.snakes.pop(snake_id, None)
+            elif flags & SPAWNED:
+                cells, offset = self.read_cells(payload, offset)
+                self.snakes[snake_id] = MirrorSnake(self.cell_number, cells)
+            else:
+                snake = self.snakes[snake_id]
+                snake.move(DIRECTIONS[flags & MOVE_MASK], flags & TAIL)
+                if flags & ATE:
+                    snake.score += 1
+        count, offset = get_varint(payload, offset)
+        for _ in range(count):
+            slot, offset = get_varint(payload, offset)
+            fruit, offset = get_varint(payload, offset)
+            self.fruits[slot] = fruit - 1 if fruit else None
+
+
+class Connection:  # The game window's link to a server, a plain socket polled between frames
+    def __init__(self, host, port=PORT, room=0, timeout=5.0):
+        self.sock = socket.create_connection((host, port), timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.sendall(message(JOIN, room))
+        self.sock.setblocking(False)
+        self.buffer = bytearray()
+        self.mirror = ArenaMirror()
+        self.closed = False
+        while not self.mirror.synced:  # Blocks until the room has arrived, so the window can be sized to it
+            applied = self.poll(timeout)
+            if self.mirror.rejected is not None:
+                reason = REJECT_REASONS.get(self.mirror.rejected, f"reason {self.mirror.rejected}")
+                raise ConnectionError(f"server turned the join down: {reason}")
+            if not applied:
+                raise ConnectionError("server didn't send the room")
+
+    def poll(self, timeout=0.0):  # Waits up to timeout for data, applies every whole message, returns how many
+        if not select.select([self.sock], [], [], timeout)[0]:
+            return 0
+        try:
+            while True:
+                data = self.sock.recv(65536)
+                if not data:
+                    self.closed = True
+                    break
+                self.buffer += data
+                if len(data) < 65536:
+                    break
+        except BlockingIOError:
+            pass
+
+        buffer, applied, start = self.buffer, 0, 0
+        while len(buffer) - start >= LENGTH.size:
+            size, = LENGTH.unpack_from(buffer, start)
+            end = start + LENGTH.size + size
+            if len(buffer) < end:
+                break
+            self.mirror.apply(bytes(buffer[start + LENGTH.size:end]))
+            start = end
+            applied += 1
+        del buffer[:start]
+        return applied
+
+    def send_turn(self, code):
+        try:
+            self.sock.sendall(message(TURN, code))
+        except OSError:
+            self.closed = True
+
+    def close(self):
+        self.sock.close()
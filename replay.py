@@ -0,0 +1,182 @@
+import argparse
+import time
+
+from engine import NORTH, SOUTH, EAST, WEST, DIED, SnakeEngine
+from varint import read_varint, write_varint
+
+MAGIC = b"SNKR"
+VERSION = 2
+READABLE = (b"\x01", b"\x02")  # Version bytes this reads, version 1 being the same less speed changes
+EXTENSION = ".replay"
+
+# Each record is one varint holding the ticks since the last record above a 3 bit code, so a turn made within 31
+# ticks of the one before costs a single byte
+DIRECTIONS = (NORTH, SOUTH, EAST, WEST)
+CODES = {direction: code for code, direction in enumerate(DIRECTIONS)}
+END = 4  # The last record, followed by the final score and length so a replay can check itself
+SPEED = 5  # The tick length changing from the next tick on, followed by the new length in milliseconds
+
+
+class ReplayWriter:  # Streams one game's turns to a file as they happen
+    def __init__(self, path, seed, cell_number, game_speed):
+        self.path = path
+        self.file = open(path, "wb")
+        self.file.write(MAGIC + bytes([VERSION]))
+        for value in (seed, cell_number, game_speed):
+            write_varint(self.file, value)
+        self.last_tick = 0
+
+    def record(self, tick, code):
+        write_varint(self.file, (tick - self.last_tick) << 3 | code)
+        self.last_tick = tick
+
+    def turn(self, tick, direction):  # A turn made after the given number of ticks, so it applies to the next one
+        self.record(tick, CODES[direction])
+
+    def speed(self, tick, game_speed):  # The game speed changing part way through, from the pause menu
+        self.record(tick, SPEED)
+        write_varint(self.file, game_speed)
+
+    def finish(self, tick, score, length):  # Ends the game, after which the file is closed
+        self.record(tick, END)
+        write_varint(self.file, score)
+        write_varint(self.file, length)
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+
+class Replay:  # Reads a replay's header up front and streams its records one at a time
+    def __init__(self, stream):
+        self.stream = stream
+        if stream.read(len(MAGIC)) != MAGIC or stream.read(1) not in READABLE:
+            raise ValueError(f"not a version 1 to {VERSION} replay")
+        self.seed = read_varint(stream)
+        self.cell_number = read_varint(stream)
+        self.game_speed = read_varint(stream)
+        if self.game_speed is None:  # The stream ran out part way through the header
+            raise ValueError("replay header is cut short")
+        self.final = None  # (ticks, score, length) once the end record has been read, if the game was finished
+        self.final_speed = self.game_speed  # The speed as of the last record read, so the one it finished at
+
+    @classmethod
+    def open(cls, path):
+        return cls(open(path, "rb"))
+
+    def close(self):
+        self.stream.close()
+
+    def records(self):  # Yields (tick, direction, speed), with one of the two set, or neither for the end of the game
+        tick = 0
+        while True:
+            value = read_varint(self.stream)
+            if value is None:
+                return
+            tick += value >> 3
+            code = value & 7
+            if code == END:
+                self.final = (tick, read_varint(self.stream), read_varint(self.stream))
+                yield tick, None, None
+                return
+            if code == SPEED:
+                self.final_speed = read_varint(self.stream)
+                if not self.final_speed:
+                    raise ValueError(f"bad speed change at tick {tick}")
+                yield tick, None, self.final_speed
+                continue
+            if code >= len(DIRECTIONS):
+                raise ValueError(f"unknown record code {code} at tick {tick}")
+            yield tick, DIRECTIONS[code], None
+
+
+def simulate(replay, engine=None, on_tick=None, on_speed=None):  # Re-runs a replay flat out, returns the engine
+    if engine is None:
+        engine = SnakeEngine(replay.cell_number, replay.seed)
+    for tick, direction, speed in replay.records():
+        while engine.ticks < tick and engine.alive:
+            events = engine.step()
+            if on_tick is not None:
+                on_tick(engine, events)
+        if direction is not None:
+            engine.turn(direction)
+        if speed is not None and on_speed is not None:
+            on_speed(speed)
+    return engine
+
+
+def verify(path):  # Checks a finished replay ends on the score and length it recorded
+    try:
+        replay = Replay.open(path)
+        try:
+            engine = simulate(replay)
+        finally:
+            replay.close()
+    except (OSError, ValueError) as error:  # One unreadable file fails on its own rather than ending the batch
+        return False, str(error)
+    if replay.final is None:
+        return False, "replay has no end record"
+    result = (engine.ticks, engine.score, engine.length)
+    if result != replay.final:
+        return False, f"expected ticks/score/length {replay.final}, got {result}"
+    return True, f"{engine.ticks} ticks, score {engine.score}"
+
+
+def watch(path, unthrottled=False):  # Plays a replay back in the game window, in real time unless unthrottled
+    import pygame
+    from main import Game  # Only watching needs a window and the game's assets
+
+    replay = Replay.open(path)
+    game = Game(replay.seed, replay.cell_number)
+    game.set_game_speed(replay.game_speed)
+    game.resume_play()
+
+    def on_tick(engine, events):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+                raise KeyboardInterrupt
+        if game.camera.follow():  # On a board bigger than the window the view scrolls with the snake
+            game.dirty.invalidate()
+        game.check_collision(events)
+        if DIED in events:
+            game.assets.play_sound("crash")
+        game.draw_dirty()
+        if not unthrottled:
+            pygame.time.wait(game.game_speed)
+
+    try:
+        simulate(replay, game.engine, on_tick, game.set_game_speed)
+        pygame.time.wait(1000)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        replay.close()
+        pygame.quit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plays back or verifies recorded games")
+    parser.add_argument("replays", nargs="+")
+    parser.add_argument("--verify", action="store_true", help="Re-simulate headless and check each final score")
+    parser.add_argument("--unthrottled", action="store_true", help="Watch as fast as the game can draw")
+    args = parser.parse_args()
+
+    if not args.verify:
+        for path in args.replays:
+            watch(path, args.unthrottled)
+        return
+
+    start = time.perf_counter()
+    failures = 0
+    for path in args.replays:
+        ok, message = verify(path)
+        failures += not ok
+        print(f"{'ok' if ok else 'FAIL':>4} {path}: {message}")
+    elapsed = time.perf_counter() - start
+    print(f"{len(args.replays) - failures}/{len(args.replays)} replays verified in {elapsed:.2f}s "
+          f"({len(args.replays) / elapsed:.0f} replays/s)")
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
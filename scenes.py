@@ -0,0 +1,144 @@
+import pygame
+
+IDLE_TIMEOUT = 1000  # Longest a static screen sleeps waiting for an event, in milliseconds
+
+
+class Scene:  # One screen of the game, only the scene on top of the game's scene stack runs
+    animated = False  # Animated scenes run every frame, static ones sleep until an event asks for a redraw
+
+    def __init__(self, game):
+        self.game = game
+        self.needs_redraw = True
+
+    def enter(self):  # Called whenever the scene comes out on top, pushed or uncovered
+        self.needs_redraw = True
+
+    def handle_event(self, event):
+        pass
+
+    def draw(self):
+        pass
+
+    def shown(self):  # Called once a redraw has reached the screen
+        pass
+
+    def run(self):  # One pass of the main loop for a static scene: redraw if asked to, then sleep until an event
+        if self.needs_redraw:
+            self.needs_redraw = False
+            self.draw()
+            self.game.update_window()
+            self.shown()
+        event = pygame.event.wait(IDLE_TIMEOUT)
+        if event.type != pygame.NOEVENT:
+            self.game.dispatch([event] + pygame.event.get())
+
+
+class StartScene(Scene):
+    def __init__(self, game):
+        super().__init__(game)
+        self.first_frame = True
+
+    def handle_event(self, event):
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
+            self.game.running = True
+            self.game.start_recording()
+            self.game.replace_scene(PlayScene(self.game))
+
+    def draw(self):
+        game = self.game
+        game.WINDOW.fill(game.WHITE)
+        game.draw_background()
+        game.draw_elements()
+        game.draw_sprite("start_spacebar", 163, 315)
+
+    def shown(self):
+        if self.first_frame:
+            self.first_frame = False
+            self.game.startup.mark("first frame")
+            if self.game.startup_report:
+                print(self.game.startup.report())
+            self.game.assets.play_bgm()
+
+
+class PlayScene(Scene):
+    animated = True
+
+    def enter(self):
+        self.game.game_active = True
+        self.game.resume_play()
+
+    def handle_event(self, event):
+        self.game.handle_event(event)
+
+    def run(self):
+        self.game.play_frame()
+
+
+class PauseScene(Scene):
+    def enter(self):
+        super().enter()
+        game = self.game
+        self.resume_rect = game.assets.atlas.get_rect("resume", topleft=game.scaled(294, 430))
+        self.options_rect = game.assets.atlas.get_rect("button_options", topleft=game.scaled(800, 0))
+
+    def handle_event(self, event):
+        click = event.type == pygame.MOUSEBUTTONDOWN and event.button == 1
+        if click and self.resume_rect.collidepoint(event.pos) or \
+                event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+            self.game.pop_scene()
+        elif click and self.options_rect.collidepoint(event.pos):
+            self.game.push_scene(OptionsScene(self.game, menus=2))  # Picking a speed goes past this menu too
+
+    def draw(self):
+        self.game.redraw()
+        self.game.draw_sprite("resume", 294, 430)
+        self.game.draw_sprite("button_options", 800, 0)
+
+
+class OptionsScene(Scene):
+    def __init__(self, game, menus=1):  # menus is how many scenes, itself included, to close once a speed is picked
+        super().__init__(game)
+        self.menus = menus
+
+    def handle_event(self, event):
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+            self.game.pop_scene()
+        elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            speed = self.game.difficulty_button_at(event.pos)
+            if speed is not None:
+                self.game.set_game_speed(speed)
+                self.game.pop_scene(self.menus)  # Straight back to whatever opened the menus
+
+    def draw(self):
+        self.game.difficulty_selection_screen()
+
+
+class GameOverScene(Scene):
+    def enter(self):
+        super().enter()
+        self.game.game_active = False
+
+    def handle_event(self, event):
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+            pygame.event.post(pygame.event.Event(pygame.QUIT))
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
+            self.game.game_clear()
+            self.game.replace_scene(PlayScene(self.game))
+
+    def draw(self):
+        game = self.game
+        game.draw_background()
+        game.draw_sprite("game_over", 268, 268)
+        game.draw_sprite("press_spacebar", 260, 21)
+        game.display_score()
+
+
+class NetworkScene(Scene):  # Plays in a room on a server, which does all the ticking
+    animated = True
+
+    def handle_event(self, event):
+        if event.type == pygame.KEYDOWN:
+            self.game.network_key(event.key)
+
+    def run(self):
+        self.game.network_frame()
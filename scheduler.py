@@ -0,0 +1,84 @@
+import time
+from collections import deque
+
+
+def percentile(values, fraction):  # Nearest-rank percentile of a sequence, or 0 if it's empty
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+class FixedTimestep:  # Hands out simulation ticks at exactly one per step, however often the loop comes round
+    def __init__(self, step_ms, max_catch_up=5):
+        self.step = step_ms / 1000
+        self.max_catch_up = max_catch_up  # A stalled frame never owes more than this many ticks
+        self.accumulator = 0.0
+        self.last_time = time.perf_counter()
+
+    def set_step(self, step_ms):
+        self.step = step_ms / 1000
+        self.accumulator = min(self.accumulator, self.step)
+
+    def reset(self, now=None):  # Forgets any time that passed while the game wasn't running, e.g. on a menu
+        self.accumulator = 0.0
+        self.last_time = time.perf_counter() if now is None else now
+
+    def advance(self, now):  # Banks the time since the last call
+        self.accumulator = min(self.accumulator + now - self.last_time, self.step * self.max_catch_up)
+        self.last_time = now
+
+    def due(self):  # Takes one tick out of the bank if there is one
+        if self.accumulator >= self.step:
+            self.accumulator -= self.step
+            return True
+        return False
+
+    @property
+    def alpha(self):  # How far we are between the last tick and the next, for drawing in between
+        return self.accumulator / self.step
+
+    def time_to_next(self):
+        return max(0.0, self.step - self.accumulator)
+
+
+class TimingStats:  # Records tick intervals and input-to-move latency so schedulers can be compared
+    def __init__(self, size=2000):
+        self.tick_intervals = deque(maxlen=size)
+        self.input_latency = deque(maxlen=size)
+        self.lost_inputs = 0
+        self.last_tick = None
+
+    def record_tick(self, now):
+        if self.last_tick is not None:
+            self.tick_intervals.append(now - self.last_tick)
+        self.last_tick = now
+
+    def record_input(self, pressed_at, moved_at):
+        self.input_latency.append(moved_at - pressed_at)
+
+    def record_lost(self):  # A press that never made it to the snake
+        self.lost_inputs += 1
+
+    def clear(self):
+        self.tick_intervals.clear()
+        self.input_latency.clear()
+        self.lost_inputs = 0
+        self.last_tick = None
+
+    def pause(self):  # The next tick interval would include time spent on a menu, so don't count it
+        self.last_tick = None
+
+    def report(self, step_ms):  # Tick jitter and input latency percentiles, in milliseconds
+        jitter = [abs(interval * 1000 - step_ms) for interval in self.tick_intervals]
+        latency = [delay * 1000 for delay in self.input_latency]
+        return {
+            "ticks": len(self.tick_intervals),
+            "jitter_p50": percentile(jitter, 0.5),
+            "jitter_p99": percentile(jitter, 0.99),
+            "inputs": len(latency),
+            "latency_p50": percentile(latency, 0.5),
+            "latency_p99": percentile(latency, 0.99),
+            "lost": self.lost_inputs,
+        }
@@ -0,0 +1,206 @@
+import argparse
+import asyncio
+import random
+import socket
+from collections import deque
+
+from arena import ARENA_CELLS, FRUITS, Arena
+from protocol import (PORT, WELCOME, JOIN, TURN, REJECT, ROOMS_FULL, message, read_message, get_varint,
+                      encode_keyframe, encode_delta)
+from replay import DIRECTIONS
+from scheduler import percentile
+
+TICK_MS = 100
+PLAYERS = 16  # Snakes per room before joining players go to a new one
+ROOMS = 64  # Rooms open at once, numbered 1 to this; players joining once every one is full are turned away
+KEYFRAME_TICKS = 50  # How often a full copy of each room follows its delta, so clients can check and catch up
+RESPAWN_TICKS = 10
+WRITE_LIMIT = 256 * 1024  # Bytes waiting to go to one client before it's dropped for not keeping up
+STATS_INTERVAL = 5.0
+
+
+class Room:  # One arena and the clients playing in it
+    def __init__(self, number, cell_number, fruit_count, players, seed):
+        self.number = number
+        self.arena = Arena(cell_number, fruit_count, seed)
+        self.players = players
+        self.clients = {}  # Snake id -> stream writer
+        self.next_id = 1
+        self.respawns = {}  # Snake id -> the tick it comes back on
+        self.left = []  # Snakes taken off the board since the last tick
+
+    @property
+    def full(self):
+        return len(self.clients) >= self.players
+
+    def join(self, writer, server):  # Adds a player, whose snake appears on the next tick
+        snake_id = self.next_id
+        self.next_id += 1
+        self.clients[snake_id] = writer
+        self.respawns[snake_id] = self.arena.ticks + 1
+        writer.write(message(WELCOME, snake_id, self.arena.cell_number, server.tick_ms))
+        writer.write(encode_keyframe(self.arena, server.ticks, server.overruns))
+        return snake_id
+
+    def leave(self, snake_id):
+        del self.clients[snake_id]
+        self.respawns.pop(snake_id, None)
+        if snake_id in self.arena.snakes:
+            self.arena.remove(snake_id)
+            self.left.append(snake_id)
+
+    def tick(self, server, keyframe):  # Steps the arena and sends every client the result, returns the bytes sent
+        arena = self.arena
+        moved, dead, eaten = arena.step()
+        for snake in dead:
+            self.respawns[snake.id] = arena.ticks + RESPAWN_TICKS
+        spawned = []
+        for snake_id, due in list(self.respawns.items()):
+            if due <= arena.ticks:
+                snake = arena.spawn(snake_id)
+                if snake is not None:  # Otherwise the board is too crowded, so it tries again next tick
+                    spawned.append(snake)
+                    del self.respawns[snake_id]
+
+        data = encode_delta(arena, moved, [snake.id for snake in dead] + self.left, spawned, eaten)
+        self.left = []
+        if keyframe:
+            data += encode_keyframe(arena, server.ticks, server.overruns)
+        return self.broadcast(data)
+
+    def broadcast(self, data):
+        sent = 0
+        for writer in list(self.clients.values()):
+            if writer.transport.get_write_buffer_size() > WRITE_LIMIT:
+                writer.close()  # Its reader sees the connection end and takes the snake out of the room
+                continue
+            writer.write(data)
+            sent += len(data)
+        return sent
+
+
+class Server:  # Runs every room on one event loop, ticking them all together at a fixed rate
+    def __init__(self, tick_ms=TICK_MS, cell_number=ARENA_CELLS, fruit_count=FRUITS, players=PLAYERS,
+                 rooms=ROOMS, keyframe_ticks=KEYFRAME_TICKS, seed=None):
+        self.tick_ms = tick_ms
+        self.cell_number = cell_number
+        self.fruit_count = fruit_count
+        self.players = players
+        self.room_limit = rooms
+        self.keyframe_ticks = keyframe_ticks
+        self.rng = random.Random(seed)
+        self.rooms = {}
+        self.ticks = 0
+        self.overruns = 0  # Ticks that finished after the next one was due
+        self.durations = deque(maxlen=1000)  # Seconds each recent tick took across every room
+        self.sent = 0
+
+    def room_for(self, number):  # The room asked for, made if need be, or failing that any with space; None when
+        # every room there can be is full. 0 asks for any room
+        room = self.rooms.get(number)
+        if not 0 < number <= self.room_limit or room is not None and room.full:
+            room = next((room for room in self.rooms.values() if not room.full), None)
+            if room is not None:
+                return room
+            number = next((number for number in range(1, self.room_limit + 1) if number not in self.rooms), None)
+            if number is None:
+                return None
+        if room is None:
+            room = self.rooms[number] = Room(number, self.cell_number, self.fruit_count, self.players,
+                                             self.rng.randrange(2 ** 32))
+        return room
+
+    async def handle_client(self, reader, writer):
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        room = snake_id = None
+        try:
+            payload = await read_message(reader)
+            if payload[0] != JOIN:
+                return
+            room = self.room_for(get_varint(payload, 1)[0])
+            if room is None:
+                writer.write(message(REJECT, ROOMS_FULL))
+                return
+            snake_id = room.join(writer, self)
+            while True:
+                payload = await read_message(reader)
+                if payload[0] == TURN and len(payload) > 1 and payload[1] < len(DIRECTIONS):
+                    room.arena.turn(snake_id, DIRECTIONS[payload[1]])
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError, IndexError):
+            pass
+        finally:
+            if snake_id is not None:
+                room.leave(snake_id)
+                if not room.clients:
+                    del self.rooms[room.number]
+            writer.close()
+
+    async def tick_loop(self):  # One tick for every room per step, skipping ahead rather than bursting after a stall
+        loop = asyncio.get_running_loop()
+        step = self.tick_ms / 1000
+        next_tick = loop.time() + step
+        while True:
+            await asyncio.sleep(next_tick - loop.time())
+            start = loop.time()
+            self.ticks += 1
+            keyframe = self.ticks % self.keyframe_ticks == 0
+            for room in list(self.rooms.values()):
+                self.sent += room.tick(self, keyframe)
+            end = loop.time()
+            self.durations.append(end - start)
+            next_tick += step
+            if end > next_tick:
+                self.overruns += 1
+                next_tick = end
+
+    async def report(self, interval=STATS_INTERVAL):  # Prints the load every so often
+        ticks, overruns, sent = self.ticks, self.overruns, self.sent
+        while True:
+            await asyncio.sleep(interval)
+            clients = sum(len(room.clients) for room in self.rooms.values())
+            durations = [duration * 1000 for duration in self.durations]
+            print(f"{len(self.rooms)} rooms, {clients} clients, {self.ticks - ticks} ticks, "
+                  f"{self.overruns - overruns} overruns, tick p50 {percentile(durations, 0.5):.2f}ms "
+                  f"p99 {percentile(durations, 0.99):.2f}ms, {(self.sent - sent) / interval / 1024:.0f} KiB/s out",
+                  flush=True)
+            ticks, overruns, sent = self.ticks, self.overruns, self.sent
+
+    async def serve(self, host, port, backlog=1024):
+        server = await asyncio.start_server(self.handle_client, host, port, backlog=backlog)
+        print(f"Serving on {host}:{port}, {self.tick_ms}ms ticks, {self.cell_number}x{self.cell_number} rooms of "
+              f"{self.players}", flush=True)
+        tasks = [asyncio.ensure_future(self.tick_loop()), asyncio.ensure_future(self.report())]
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hosts multiplayer rooms, each ticked on the server and streamed "
+                                                 "to its players as per tick changes")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--tick-ms", type=int, default=TICK_MS)
+    parser.add_argument("--cells", type=int, default=ARENA_CELLS)
+    parser.add_argument("--fruits", type=int, default=FRUITS)
+    parser.add_argument("--players", type=int, default=PLAYERS, help="Players per room")
+    parser.add_argument("--rooms", type=int, default=ROOMS, help="Most rooms open at once")
+    parser.add_argument("--keyframe-ticks", type=int, default=KEYFRAME_TICKS)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    server = Server(args.tick_ms, args.cells, args.fruits, args.players, args.rooms, args.keyframe_ticks,
+                    args.seed)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+from collections import OrderedDict
+
+import pygame
+
+
+class TextCache:  # Remembers rendered text so labels that rarely change aren't rasterised again every frame
+    def __init__(self, max_entries=128, stretch=1.0):
+        self.max_entries = max_entries
+        self.stretch = stretch  # Horizontal stretch applied to everything rendered, for non-square layouts
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, colour, antialias=True):  # Font.render, served from the cache when possible
+        key = (font, text, tuple(colour), antialias)
+        surface = self.lookup(key)
+        if surface is None:
+            surface = self.stretched(font.render(text, antialias, colour))
+            self.store(key, surface)
+        return surface
+
+    def render_number(self, font, prefix, number, colour, antialias=True):  # Builds prefix + number from cached glyphs
+        # Tagged so a composite never comes back from render for the same text, or the other way round
+        key = ("number", font, prefix, number, tuple(colour), antialias)
+        surface = self.lookup(key)
+        if surface is None:
+            pieces = [self.render(font, prefix, colour, antialias)] if prefix else []
+            pieces += [self.render(font, digit, colour, antialias) for digit in str(number)]
+            surface = self.compose(pieces)
+            self.store(key, surface)
+        return surface
+
+    def lookup(self, key):
+        surface = self.surfaces.get(key)
+        if surface is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.surfaces.move_to_end(key)
+        return surface
+
+    def store(self, key, surface):
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last=False)
+
+    def stretched(self, surface):
+        if self.stretch == 1.0:
+            return surface
+        width, height = surface.get_size()
+        return pygame.transform.smoothscale(surface, (max(1, round(width * self.stretch)), height))
+
+    @staticmethod
+    def compose(pieces):  # Lays the pieces side by side on one surface
+        width = sum(piece.get_width() for piece in pieces)
+        height = max(piece.get_height() for piece in pieces)
+        surface = pygame.Surface((max(1, width), height), pygame.SRCALPHA)
+        x = 0
+        for piece in pieces:
+            # Adding onto the clear surface copies the antialiased edges exactly instead of blending them
+            surface.blit(piece, (x, 0), special_flags=pygame.BLEND_RGBA_ADD)
+            x += piece.get_width()
+        return surface
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.surfaces),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
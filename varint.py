@@ -0,0 +1,35 @@
+def put_varint(buffer, value):  # Seven bits per byte, low bits first, high bit set on every byte but the last
+    while value > 0x7F:
+        buffer.append(value & 0x7F | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def get_varint(data, offset):  # Returns the value and the offset just past it
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def write_varint(stream, value):  # For replay files, the protocol builds whole messages with put_varint
+    data = bytearray()
+    put_varint(data, value)
+    stream.write(data)
+
+
+def read_varint(stream):  # Returns None at the end of the stream
+    data = bytearray()
+    while True:
+        byte = stream.read(1)
+        if not byte:
+            if data:
+                raise ValueError("stream ends part way through a number")
+            return None
+        data += byte
+        if byte[0] < 0x80:
+            return get_varint(data, 0)[0]